@@ -0,0 +1,8 @@
+#!/usr/bin/env python3
+"""
+Preview Tables
+Byte translation tables shared by the file previews and the wine tools
+"""
+
+# Translation table mapping non-printable bytes to '.' for header previews
+PRINTABLE_ASCII_TABLE = bytes(b if 32 <= b <= 126 else 0x2E for b in range(256))
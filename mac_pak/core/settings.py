@@ -117,7 +117,7 @@ class SettingsManager:
                         if file.lower() == 'divine.exe':
                             # Convert to Wine Z: path format
                             divine_path = os.path.join(root, file)
-                            wine_path = f"Z:{divine_path.replace('/', chr(92))}"
+                            wine_path = "Z:" + divine_path.replace("/", "\\")
                             return wine_path
         
         # Development or manual installation - empty default
@@ -145,6 +145,10 @@ class SettingsManager:
         """Set a setting value"""
         self.settings.setValue(key, value)
     
+    def snapshot(self, keys):
+        """Get several setting values at once as a dict"""
+        return {key: self.settings.value(key) for key in keys}
+    
     def sync(self):
         """Force sync settings to disk"""
         self.settings.sync()
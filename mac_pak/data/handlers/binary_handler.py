@@ -8,6 +8,7 @@ import os
 import tempfile
 from typing import Dict
 
+from ...core.preview_tables import PRINTABLE_ASCII_TABLE
 from .base_handler import FormatHandler
 
 class BinaryFormatHandler(FormatHandler):
@@ -144,7 +145,7 @@ class BinaryFormatHandler(FormatHandler):
             content = f"Larian Binary File ({file_ext.upper()})\n\n"
             
             # Look for magic bytes or signatures
-            readable_header = ''.join(chr(b) if 32 <= b <= 126 else '.' for b in header[:32])
+            readable_header = header[:32].translate(PRINTABLE_ASCII_TABLE).decode('ascii')
             content += f"Header: {readable_header}\n"
             content += f"File size: {file_size:,} bytes\n"
             
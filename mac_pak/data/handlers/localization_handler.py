@@ -7,6 +7,7 @@ Handles: .loca localization files
 import os
 from typing import Dict
 
+from ...core.preview_tables import PRINTABLE_ASCII_TABLE
 from .base_handler import FormatHandler
 
 class LocalizationHandler(FormatHandler):
@@ -144,7 +145,7 @@ class LocalizationHandler(FormatHandler):
             content += self._detect_binary_patterns(data)
             
             # Show readable strings
-            readable_chars = ''.join(chr(b) if 32 <= b <= 126 else '.' for b in data[:100])
+            readable_chars = data[:100].translate(PRINTABLE_ASCII_TABLE).decode('ascii')
             content += f"Header preview: {readable_chars}\n"
             
             content += "\nNote: Install divine.exe for detailed .loca parsing.\n"
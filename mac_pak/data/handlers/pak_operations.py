@@ -5,7 +5,9 @@ Handles all PAK file operations with proper threading and progress reporting
 This replaces the pak_utils.py functionality with PyQt6 threading
 """
 
+import logging
 import os
+import queue
 import threading
 import time
 import tempfile
@@ -18,6 +20,37 @@ from PyQt6.QtWidgets import (
     QLineEdit, QPushButton, QTreeWidget, QTreeWidgetItem, QGroupBox, QCheckBox
 )
 
+logger = logging.getLogger(__name__)
+
+# Persistent threads for PAK listings; each listing is a Wine process, so keep no more than the CPUs can run
+LIST_WORKERS = max(1, min(4, os.cpu_count() or 1))
+
+# Listing jobs waiting for a worker thread, and the workers started so far
+_list_jobs = queue.SimpleQueue()
+_list_threads = []
+_list_threads_lock = threading.Lock()
+
+
+def _run_list_jobs():
+    """Worker loop - run queued listing jobs for the life of the app"""
+    while True:
+        job = _list_jobs.get()
+        try:
+            job()
+        except Exception:
+            logger.exception("PAK listing job failed")
+
+
+def submit_list_job(job):
+    """Queue job for the listing threads, starting them on first use"""
+    _list_jobs.put(job)
+    with _list_threads_lock:
+        # Daemon threads, like the per-listing threads they replace, so quitting never waits on Wine
+        while len(_list_threads) < LIST_WORKERS:
+            thread = threading.Thread(target=_run_list_jobs, name=f"pak-list-{len(_list_threads)}", daemon=True)
+            thread.start()
+            _list_threads.append(thread)
+
 class PAKOperations(QObject):
     """PAK operations backend that integrates with WineWrapper"""
     
@@ -134,30 +167,16 @@ class PAKOperations(QObject):
                 if progress_callback:
                     progress_callback(20, "Reading PAK structure...")
                 
-                # Use WineWrapper's list method
+                # list_pak_contents already parses Divine's output into {name, size, type} dicts
                 files = self.wine_wrapper.list_pak_contents(pak_file)
                 
                 if progress_callback:
                     progress_callback(80, f"Found {len(files)} files...")
                 
-                # Format file information
-                formatted_files = []
-                for file_info in files:
-                    if isinstance(file_info, dict):
-                        formatted_files.append(file_info)
-                    else:
-                        # Convert string to dict format
-                        file_name = str(file_info)
-                        file_type = 'folder' if '.' not in file_name else 'file'
-                        formatted_files.append({
-                            'name': file_name,
-                            'type': file_type
-                        })
-                
                 result_data = {
-                    'success': len(formatted_files) > 0,
-                    'files': formatted_files,
-                    'file_count': len(formatted_files),
+                    'success': len(files) > 0,
+                    'files': files,
+                    'file_count': len(files),
                     'pak_file': pak_file
                 }
                 
@@ -178,9 +197,8 @@ class PAKOperations(QObject):
                 if completion_callback:
                     completion_callback(result_data)
         
-        # Start thread
-        thread = threading.Thread(target=list_worker, daemon=True)
-        thread.start()
+        # Reuse the shared listing threads - their count also caps concurrent Wine launches
+        submit_list_job(list_worker)
     
     def validate_mod_structure(self, mod_dir):
         """
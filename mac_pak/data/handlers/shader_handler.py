@@ -7,6 +7,7 @@ Handles: .bshd, .shd shader files
 import os
 from typing import Dict
 
+from ...core.preview_tables import PRINTABLE_ASCII_TABLE
 from .base_handler import FormatHandler
 
 class ShaderFormatHandler(FormatHandler):
@@ -251,7 +252,7 @@ class ShaderFormatHandler(FormatHandler):
             analysis += "Unknown shader format\n"
         
         # Extract readable strings
-        readable_chars = ''.join(chr(b) if 32 <= b <= 126 else '.' for b in header)
+        readable_chars = header.translate(PRINTABLE_ASCII_TABLE).decode('ascii')
         analysis += f"Header: {readable_chars[:40]}...\n"
         
         # Analyze filename
@@ -5,14 +5,35 @@ Entry point for MacPak.
 
 import sys
 import os
+import atexit
+import logging
+import queue
+from logging.handlers import QueueHandler, QueueListener
 from pathlib import Path
 from PyQt6.QtWidgets import QApplication
 from PyQt6.QtCore import Qt
 import PyQt6.QtCore
 from .version import *
 
+def setup_logging():
+    """Route log records through a queue so worker threads never block on console output"""
+    log_queue = queue.SimpleQueue()
+    
+    console_handler = logging.StreamHandler()
+    console_handler.setFormatter(logging.Formatter('%(asctime)s - %(threadName)s - %(message)s'))
+    
+    # A single listener thread does the actual writing
+    listener = QueueListener(log_queue, console_handler, respect_handler_level=True)
+    listener.start()
+    atexit.register(listener.stop)
+    
+    root_logger = logging.getLogger()
+    root_logger.setLevel(logging.INFO)
+    root_logger.addHandler(QueueHandler(log_queue))
+
 def main():
     """Main application entry point"""
+    setup_logging()
     print("Launching MacPak (PyQt6)...")
     
     # Check Python version
@@ -4,56 +4,212 @@ Base Operations Module
 Shared utilities and base functionality for all wine wrapper modules
 """
 
+import functools
+import logging
 import os
 import subprocess
+import threading
+from concurrent.futures import ThreadPoolExecutor, as_completed
 from pathlib import Path
+from stat import S_ISDIR, S_ISREG
+from time import monotonic, time as _wall_time
 
 from .wine_environment import WineProcessMonitor
 
+logger = logging.getLogger(__name__)
+
+# Translation tables for converting path separators between Mac and Wine
+MAC_TO_WINE_TABLE = str.maketrans('/', '\\')
+WINE_TO_MAC_TABLE = str.maketrans('\\', '/')
+
+# Rough operation time estimates in seconds per MB
+OPERATION_SECONDS_PER_MB = {
+    'extract': 0.1,
+    'create': 0.2,
+    'convert': 0.05,
+    'analyze': 0.01
+}
+
+# Seconds wineserver stays up after its last client exits during batch work
+WINESERVER_LINGER_SECONDS = 30
+
+# Wine is multi-threaded itself, so batch work doesn't start one Divine.exe per core,
+# and each instance holds its own .NET runtime, so cap the total on many-core machines
+DEFAULT_DIVINE_WORKERS = max(1, min(8, (os.cpu_count() or 2) // 2))
+
+# Minimum seconds between batch progress callbacks that don't change the percentage
+PROGRESS_UPDATE_INTERVAL = 0.1
+
+# Divine.exe command line flags for the keyword arguments used by the wine modules
+DIVINE_FLAGS = {
+    'input_format': '--input-format',
+    'output_format': '--output-format',
+    'gr2_options': '--gr2-options',
+    'conform_path': '--conform-path',
+    'packaged_path': '--packaged-path',
+    'compression_method': '--compression-method',
+    'package_priority': '--package-priority',
+    'use_package_name': '--use-package-name',
+    'expression': '--expression',
+    'use_regex': '--use-regex',
+}
+
+
+def build_divine_command(wine_path, lslib_path, action, source=None, destination=None, **kwargs):
+    """Build the argv for a Divine.exe invocation"""
+    cmd = [wine_path, lslib_path, "--action", action, "--game", "bg3"]
+    
+    if source:
+        cmd += ("--source", source)
+    if destination:
+        cmd += ("--destination", destination)
+    
+    # Add additional arguments, deriving (and remembering) flags for unknown keys
+    for key, value in kwargs.items():
+        flag = DIVINE_FLAGS.get(key)
+        if flag is None:
+            flag = DIVINE_FLAGS[key] = f"--{key.replace('_', '-')}"
+        cmd += (flag, str(value))
+    
+    return cmd
+
+
+def run_divine_process(cmd, env, timeout=120):
+    """Run a Divine.exe command to completion without Qt, for worker threads"""
+    try:
+        # close_fds=False lets subprocess use posix_spawn instead of fork+exec; Python opens its own
+        # fds non-inheritable, so nothing extra leaks into Wine
+        result = subprocess.run(cmd, env=env, timeout=timeout, capture_output=True, text=True, close_fds=False)
+    except subprocess.TimeoutExpired:
+        return False, "Process timed out"
+    except OSError as e:
+        return False, f"Failed to start process: {e}"
+    
+    if result.returncode == 0:
+        return True, result.stdout
+    return False, result.stderr.strip() or f"Process failed with exit code {result.returncode}"
+
+
+def _output_written(path):
+    """Check that a conversion produced a non-empty file, with a single stat"""
+    try:
+        return os.stat(path).st_size > 0
+    except OSError:
+        return False
+
+
+def _convert_one(wine_path, lslib_path, env, action, source, destination, verify_output=True, **kwargs):
+    """Convert a single file with its own Divine.exe process"""
+    cmd = build_divine_command(
+        wine_path, lslib_path, action, to_wine_path(source), to_wine_path(destination), **kwargs
+    )
+    
+    success, output = run_divine_process(cmd, env)
+    if success and verify_output and not _output_written(destination):
+        return False, f"Output file was not created: {destination}"
+    return success, output
+
+
+@functools.lru_cache(maxsize=8192)
+def _absolute_to_wine_path(abs_path):
+    """Convert an absolute Mac path to Wine path format"""
+    return "Z:" + os.path.normpath(abs_path).translate(MAC_TO_WINE_TABLE)
+
+
+def to_wine_path(mac_path):
+    """Convert Mac path to Wine path format, memoizing absolute paths"""
+    # Relative paths depend on the current directory, so only their absolute form is cached
+    if not os.path.isabs(mac_path):
+        mac_path = os.path.abspath(mac_path)
+    return _absolute_to_wine_path(mac_path)
+
+
+def read_file_header(file_path, size=64):
+    """Read the first size bytes of a file with raw os calls, skipping the file object layer"""
+    fd = os.open(file_path, os.O_RDONLY)
+    try:
+        return os.read(fd, size)
+    finally:
+        os.close(fd)
+
+
+def iter_dir_files(root):
+    """Yield a DirEntry for every file under root using an explicit scandir stack"""
+    stack = [root]
+    while stack:
+        try:
+            entries = os.scandir(stack.pop())
+        except OSError:
+            continue
+        with entries:
+            for entry in entries:
+                if entry.is_dir(follow_symlinks=False):
+                    stack.append(entry.path)
+                elif entry.is_file():
+                    yield entry
+
+
+def count_dir_files(root):
+    """Count the files under root without building any per-directory lists"""
+    return sum(1 for _ in iter_dir_files(root))
+
+
+def iter_files_with_ext(root, ext):
+    """Yield the path of every file under root whose name ends with ext (case-insensitive)"""
+    ext = ext.lower()
+    ext_len = len(ext)
+    stack = [root]
+    while stack:
+        try:
+            entries = os.scandir(stack.pop())
+        except OSError:
+            continue
+        with entries:
+            for entry in entries:
+                # Check the name first so non-matching entries never need is_file()
+                if entry.name[-ext_len:].lower() == ext and entry.is_file():
+                    yield entry.path
+                elif entry.is_dir(follow_symlinks=False):
+                    stack.append(entry.path)
+
 
 class BaseWineOperations:
     """Base class with shared functionality for all wine operations"""
     
+    # Progress message reported when a synchronous Divine.exe command succeeds
+    completion_message = "Operation complete!"
+    
     def __init__(self, wine_env, lslib_path, settings_manager=None):
         self.wine_env = wine_env
         self.lslib_path = lslib_path
         self.settings_manager = settings_manager
         self.current_monitor = None
+        self._batch_cancelled = threading.Event()
+        self._thread_monitors = threading.local()
     
     def mac_to_wine_path(self, mac_path):
         """Convert Mac path to Wine path format"""
-        abs_path = os.path.abspath(mac_path)
-        wine_path = f"Z:{abs_path.replace('/', chr(92))}"  # Use chr(92) for backslash
-        return wine_path
+        return to_wine_path(mac_path)
     
     def wine_to_mac_path(self, wine_path):
         """Convert Wine path back to Mac path format"""
         if wine_path.startswith("Z:"):
-            mac_path = wine_path[2:].replace(chr(92), '/')  # Remove Z: and convert backslashes
-            return mac_path
+            return wine_path[2:].translate(WINE_TO_MAC_TABLE)  # Remove Z: and convert backslashes
         return wine_path
     
     def run_divine_command(self, action, source=None, destination=None, progress_callback=None, **kwargs):
         """Run Divine.exe command with monitoring"""
         
         # Build command
-        cmd = [self.wine_env.wine_path, self.lslib_path, "--action", action, "--game", "bg3"]
-        
-        if source:
-            cmd.extend(["--source", source])
-        if destination:
-            cmd.extend(["--destination", destination])
-        
-        # Add additional arguments
-        for key, value in kwargs.items():
-            cmd.extend([f"--{key.replace('_', '-')}", str(value)])
+        cmd = build_divine_command(
+            self.wine_env.wine_path, self.lslib_path, action, source, destination, **kwargs
+        )
         
         # Setup environment
-        env = os.environ.copy()
-        env["WINEPREFIX"] = self.wine_env.wine_prefix
+        env = self.wine_env.get_process_env()
         
-        # Use process monitor for real-time feedback
-        self.current_monitor = WineProcessMonitor()
+        # Use this instance's process monitor for the calling thread, for real-time feedback
+        self.current_monitor = self._get_thread_monitor()
         
         if progress_callback:
             progress_callback(5, f"Starting {action}...")
@@ -61,15 +217,144 @@ class BaseWineOperations:
         success, output = self.current_monitor.run_process(cmd, env, progress_callback)
         
         if progress_callback and success:
-            progress_callback(100, "Operation complete!")
+            progress_callback(100, self.completion_message)
         
         return success, output
     
+    def _get_thread_monitor(self):
+        """Return this instance's reusable monitor for synchronous runs on the calling thread"""
+        # Per instance, so cancelling one operation never kills a process another one started;
+        # async callers connect signals and own the monitor's lifetime, so they create their own
+        monitor = getattr(self._thread_monitors, 'monitor', None)
+        if monitor is None:
+            monitor = self._thread_monitors.monitor = WineProcessMonitor()
+        return monitor
+    
+    def convert_files_parallel(self, conversions, action="convert-resource", progress_callback=None,
+                               max_workers=None, progress_range=(0, 90), verify_output=True,
+                               progress_verb="Converted", **kwargs):
+        """Run one Divine.exe process per (source, destination) pair, several at a time
+        
+        Returns (converted_count, failures) where failures lists a "name: output" string for
+        every file that wasn't converted, including the ones skipped by a cancel.
+        verify_output checks each destination is a non-empty file; turn it off when the
+        destinations are directories. progress_verb starts each progress message. Callers
+        clear _batch_cancelled when their batch starts.
+        """
+        converted_count, failures = self.convert_files_parallel_by_source(
+            conversions, action, progress_callback, max_workers, progress_range, verify_output,
+            progress_verb, **kwargs
+        )
+        return converted_count, [f"{os.path.basename(source)}: {output}" for source, output in failures.items()]
+    
+    def convert_files_parallel_by_source(self, conversions, action="convert-resource", progress_callback=None,
+                                         max_workers=None, progress_range=(0, 90), verify_output=True,
+                                         progress_verb="Converted", **kwargs):
+        """Like convert_files_parallel, but failures maps each unconverted source path to its output"""
+        # Create each output directory once rather than once per file
+        for directory in sorted({os.path.dirname(destination) for _, destination in conversions}):
+            os.makedirs(directory, exist_ok=True)
+        
+        # One Divine.exe launch per file - keep wineserver warm between them
+        self.keep_wineserver_running()
+        
+        progress_start, progress_span = progress_range
+        last_percent, last_update = -1, 0.0
+        converted_count = 0
+        failures = {}
+        total_files = len(conversions)
+        
+        # The workers only wait on Wine subprocesses, so threads are enough here
+        with ThreadPoolExecutor(max_workers=max_workers or DEFAULT_DIVINE_WORKERS) as executor:
+            futures = {
+                executor.submit(
+                    _convert_one, self.wine_env.wine_path, self.lslib_path, self.wine_env.get_process_env(),
+                    action, source, destination, verify_output, **kwargs
+                ): source
+                for source, destination in conversions
+            }
+            
+            cancelled = False
+            for done_count, future in enumerate(as_completed(futures), 1):
+                if future.cancelled():
+                    continue
+                success, output = future.result()
+                if success:
+                    converted_count += 1
+                else:
+                    failures[futures[future]] = output
+                
+                if progress_callback:
+                    # Throttle UI updates - only report a new percentage or after a short interval
+                    percent = progress_start + int((done_count / total_files) * progress_span)
+                    now = monotonic()
+                    if percent != last_percent or now - last_update > PROGRESS_UPDATE_INTERVAL:
+                        progress_callback(
+                            percent, f"{progress_verb} {os.path.basename(futures[future])} ({done_count}/{total_files})"
+                        )
+                        last_percent, last_update = percent, now
+                
+                if not cancelled and self._batch_cancelled.is_set():
+                    # Drop the queued conversions; the ones already running still finish and are counted
+                    cancelled = True
+                    for queued in futures:
+                        if queued.cancel():
+                            failures[futures[queued]] = "Cancelled"
+        
+        return converted_count, failures
+    
+    def _batch_convert(self, source_dir, output_dir, ext_in, ext_out, progress_callback=None,
+                       max_workers=None, tree_converter=None, **kwargs):
+        """Convert every ext_in file under source_dir to ext_out, mirroring the tree - SYNCHRONOUS
+        
+        tree_converter(source_dir, output_dir, input_format, output_format, progress_callback), when
+        given, is tried first to convert the whole tree in one run.
+        """
+        self._batch_cancelled.clear()
+        
+        # Resolve the roots once so every derived path is already absolute
+        source_dir = os.path.abspath(source_dir)
+        output_dir = os.path.abspath(output_dir)
+        
+        source_files = list(iter_files_with_ext(source_dir, ext_in))
+        
+        if not source_files:
+            return False, f"No {ext_in[1:].upper()} files found"
+        
+        os.makedirs(output_dir, exist_ok=True)
+        
+        # Maintain directory structure
+        conversions = [
+            (source_file, os.path.join(output_dir, os.path.splitext(os.path.relpath(source_file, source_dir))[0] + ext_out))
+            for source_file in source_files
+        ]
+        total_files = len(conversions)
+        
+        if tree_converter and tree_converter(source_dir, output_dir, ext_in[1:], ext_out[1:], progress_callback):
+            successful_conversions = sum(1 for _, destination in conversions if _output_written(destination))
+            failures = []
+        elif self._batch_cancelled.is_set():
+            # The tree run was cancelled - don't fall back to converting file by file
+            successful_conversions = sum(1 for _, destination in conversions if _output_written(destination))
+            failures = [f"Cancelled with {total_files - successful_conversions} files not converted"]
+        else:
+            # Each file is an independent Divine.exe run, so convert up to max_workers at once
+            successful_conversions, failures = self.convert_files_parallel(
+                conversions, progress_callback=progress_callback, max_workers=max_workers, **kwargs
+            )
+        
+        for failure in failures:
+            logger.warning("Failed to convert: %s", failure)
+        
+        if progress_callback:
+            progress_callback(100, f"Converted {successful_conversions}/{total_files} files")
+        
+        return successful_conversions == total_files, f"Converted {successful_conversions}/{total_files} files"
+    
     def run_simple_wine_command(self, command, timeout=300, capture_output=True):
         """Run a simple wine command without divine.exe"""
         wine_cmd = [self.wine_env.wine_path] + command
-        env = os.environ.copy()
-        env["WINEPREFIX"] = self.wine_env.wine_prefix
+        env = self.wine_env.get_process_env()
         
         try:
             result = subprocess.run(
@@ -77,7 +362,8 @@ class BaseWineOperations:
                 env=env, 
                 timeout=timeout, 
                 capture_output=capture_output, 
-                text=True
+                text=True,
+                close_fds=False
             )
             return result.returncode == 0, result.stdout if capture_output else ""
         except subprocess.TimeoutExpired:
@@ -85,8 +371,41 @@ class BaseWineOperations:
         except Exception as e:
             return False, str(e)
     
+    def keep_wineserver_running(self, linger_seconds=WINESERVER_LINGER_SECONDS):
+        """Start a persistent wineserver so back-to-back Divine.exe launches skip its startup
+        
+        wineserver daemonizes and exits on its own once no Wine process has used the
+        prefix for linger_seconds, so no teardown is needed. If a server is already
+        running for the prefix this is a no-op.
+        """
+        if not self.wine_env.wine_path:
+            return False
+        
+        wineserver = os.path.join(os.path.dirname(self.wine_env.wine_path), "wineserver")
+        if not os.access(wineserver, os.X_OK):
+            return False
+        
+        env = self.wine_env.get_process_env()
+        
+        try:
+            # wineserver forks into the background and keeps its stdio, so don't hand it pipes -
+            # waiting for EOF on a captured pipe would stall until the timeout
+            subprocess.run(
+                [wineserver, f"--persistent={linger_seconds}"],
+                env=env,
+                timeout=10,
+                stdin=subprocess.DEVNULL,
+                stdout=subprocess.DEVNULL,
+                stderr=subprocess.DEVNULL,
+                close_fds=False
+            )
+            return True
+        except (subprocess.TimeoutExpired, OSError):
+            return False
+    
     def cancel_current_operation(self):
         """Cancel the currently running operation"""
+        self._batch_cancelled.set()
         if self.current_monitor:
             self.current_monitor.cancel()
     
@@ -122,8 +441,9 @@ class BaseWineOperations:
                 'size': stat.st_size,
                 'size_formatted': f"{stat.st_size:,} bytes",
                 'modified': stat.st_mtime,
-                'is_file': os.path.isfile(file_path),
-                'is_directory': os.path.isdir(file_path),
+                # Read the type from the stat result rather than stat-ing again
+                'is_file': S_ISREG(stat.st_mode),
+                'is_directory': S_ISDIR(stat.st_mode),
                 'extension': os.path.splitext(file_path)[1].lower()
             }
             
@@ -164,7 +484,7 @@ class BaseWineOperations:
         
         # Check Divine.exe if path provided
         if self.lslib_path:
-            divine_path = self.lslib_path.replace("Z:", "") if self.lslib_path.startswith("Z:") else self.lslib_path
+            divine_path = self.wine_to_mac_path(self.lslib_path)
             divine_valid, divine_msg = self.validate_file_exists(divine_path, "file")
             validation['divine_available'] = divine_valid
             validation['messages'].append(f"Divine.exe: {divine_msg}")
@@ -199,37 +519,39 @@ class BaseWineOperations:
         
         try:
             # Look for temporary directories
-            temp_dirs = glob.glob(temp_dir_pattern)
+            temp_dirs = [path for path in glob.glob(temp_dir_pattern) if os.path.isdir(path)]
+            if not temp_dirs:
+                return cleanup_count, errors
             
-            for temp_dir in temp_dirs:
-                if os.path.isdir(temp_dir):
-                    try:
-                        shutil.rmtree(temp_dir)
+            # rmtree is syscall-bound, so removing directories concurrently overlaps the I/O waits
+            max_workers = min(8, os.cpu_count() or 1, len(temp_dirs))
+            with ThreadPoolExecutor(max_workers=max_workers) as executor:
+                futures = {executor.submit(shutil.rmtree, temp_dir): temp_dir for temp_dir in temp_dirs}
+                
+                for future, temp_dir in futures.items():
+                    error = future.exception()
+                    if error:
+                        errors.append(f"Failed to remove {temp_dir}: {error}")
+                    else:
                         cleanup_count += 1
-                    except Exception as e:
-                        errors.append(f"Failed to remove {temp_dir}: {e}")
             
             return cleanup_count, errors
             
         except Exception as e:
             return 0, [f"Cleanup failed: {e}"]
     
-    def estimate_operation_time(self, file_path, operation_type="extract"):
-        """Estimate operation time based on file size and type"""
+    def estimate_operation_time(self, file_path=None, operation_type="extract", size_bytes=None):
+        """Estimate operation time based on file size and type
+        
+        Pass size_bytes when the size is already known (e.g. from a scandir
+        entry) to skip the stat call.
+        """
         try:
-            file_size = os.path.getsize(file_path)
+            file_size = size_bytes if size_bytes is not None else os.stat(file_path).st_size
             
             # Rough estimates in seconds based on file size
             size_mb = file_size / (1024 * 1024)
-            
-            estimates = {
-                'extract': size_mb * 0.1,  # ~0.1 seconds per MB
-                'create': size_mb * 0.2,   # ~0.2 seconds per MB  
-                'convert': size_mb * 0.05, # ~0.05 seconds per MB
-                'analyze': size_mb * 0.01  # ~0.01 seconds per MB
-            }
-            
-            estimated_seconds = estimates.get(operation_type, size_mb * 0.1)
+            estimated_seconds = size_mb * OPERATION_SECONDS_PER_MB.get(operation_type, 0.1)
             
             # Convert to human readable
             if estimated_seconds < 60:
@@ -257,7 +579,7 @@ class OperationResult:
         self.message = message
         self.data = data or {}
         self.operation_type = operation_type
-        self.timestamp = __import__('time').time()
+        self.timestamp = _wall_time()
     
     def to_dict(self):
         """Convert result to dictionary"""
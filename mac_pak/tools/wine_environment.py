@@ -6,7 +6,13 @@ Handles Wine detection, validation, and path management
 
 import subprocess
 import os
+import re
+import shutil
+import signal
+import stat
 import sys
+import time
+from collections import deque
 from pathlib import Path
 
 from PyQt6.QtCore import QProcess, QProcessEnvironment, QObject, pyqtSignal, QTimer
@@ -16,32 +22,101 @@ import logging
 # Set up logger at the top of your file
 logger = logging.getLogger(__name__)
 
+# Number of trailing stderr lines kept to report when a process fails
+STDERR_TAIL_LINES = 50
+
+# Well-known system Wine locations, checked after bundled Wine and PATH
+SYSTEM_WINE_PATHS = (
+    "/usr/local/bin/wine64",
+    "/usr/local/bin/wine",
+    "/opt/homebrew/bin/wine64",
+    "/opt/homebrew/bin/wine",
+    "/opt/local/bin/wine64",  # MacPorts
+    "/opt/local/bin/wine",
+    "/Applications/Wine.app/Contents/Resources/wine/bin/wine64",
+    "/Applications/Wine.app/Contents/Resources/wine/bin/wine",
+    "/Applications/Wineskin.app/Contents/Resources/wine/bin/wine64",
+    "/Applications/Wineskin.app/Contents/Resources/wine/bin/wine"
+)
+
+# Divine.exe output keywords mapped to the progress they report, highest priority first
+PROGRESS_KEYWORDS = {
+    "opening": (10, "Opening PAK file..."),
+    "reading": (10, "Opening PAK file..."),
+    "extracting": (50, "Extracting files..."),
+    "unpacking": (50, "Extracting files..."),
+    "creating": (50, "Creating archive..."),
+    "packing": (50, "Creating archive..."),
+    "processing": (60, "Processing files..."),
+    "writing": (70, "Writing files..."),
+    "completed": (90, "Nearly complete..."),
+    "success": (90, "Nearly complete..."),
+    "done": (90, "Nearly complete..."),
+}
+PROGRESS_PRIORITY = {keyword: priority for priority, keyword in enumerate(PROGRESS_KEYWORDS)}
+
+# Completion words must stand alone - "done" inside a path like .../Abandoned_Camp.lsf doesn't count
+TERMINAL_PROGRESS_KEYWORDS = {
+    "completed": r"(?<![\w/\\.-])completed\b",
+    "success": r"(?<![\w/\\.-])success\w*",
+    "done": r"(?<![\w/\\.-])done\b",
+}
+PROGRESS_PATTERN = re.compile(
+    "|".join(f"(?P<{keyword}>{TERMINAL_PROGRESS_KEYWORDS.get(keyword, keyword)})" for keyword in PROGRESS_KEYWORDS),
+    re.IGNORECASE
+)
+
+# Divine.exe "current/total" counters (e.g. "12/340"), not digits inside a path, and the
+# progress band they are spread across
+PROGRESS_FRACTION_PATTERN = re.compile(r'(?<![\w/])(\d+)\s*/\s*(\d+)(?![\w/])')
+FRACTION_PROGRESS_START = 20
+FRACTION_PROGRESS_END = 90
+
+# Directories every initialized Wine prefix contains
+WINE_PREFIX_ESSENTIAL_DIRS = ("dosdevices", "drive_c")
+
+# How long a Wine installation/prefix validation result is reused
+VALIDATION_CACHE_SECONDS = 60
+
+# Validation results shared by every WineEnvironmentManager, keyed by wine path / prefix, so
+# a freshly built wrapper doesn't launch `wine --version` again
+_install_validations = {}
+_prefix_validations = {}
+
 class WineProcessMonitor(QObject):
     """Monitor Wine processes using PyQt6's QProcess - truly asynchronous"""
     
     # Signals for process monitoring
     progress_updated = pyqtSignal(int, str)
     process_finished = pyqtSignal(bool, str)
+    line_received = pyqtSignal(str)
     
     def __init__(self, parent=None):
         super().__init__(parent)
         self.process = None
         self.cancelled = False
         self.progress_callback = None
-        self.stdout_data = []
-        self.stderr_data = []
+        self.stdout_buf = bytearray()
+        self._stdout_tail = b''
+        self.stderr_tail = deque(maxlen=STDERR_TAIL_LINES)
         self.timeout_timer = None
         self._last_progress = 20
+        self._progress_done = False
+        self._own_session = False
 
     def run_process(self, cmd, env=None, progress_callback=None):
         """Run a process synchronously - blocks until complete"""
         self.progress_callback = progress_callback
         self.cancelled = False
-        self.stdout_data = []
-        self.stderr_data = []
+        self.stdout_buf = bytearray()
+        self._stdout_tail = b''
+        self.stderr_tail.clear()
+        self._progress_done = False
+        self._last_progress = 20
         
         try:
             self.process = QProcess()
+            self._start_in_new_session()
             
             # Set up environment
             if env:
@@ -68,8 +143,8 @@ class WineProcessMonitor(QObject):
                 return False, "Process timed out"
             
             # Get results
-            stdout_text = '\n'.join(self.stdout_data)
-            stderr_text = '\n'.join(self.stderr_data)
+            stdout_text = self.stdout_buf.decode('utf-8', 'replace')
+            stderr_text = '\n'.join(self.stderr_tail)
             
             if self.progress_callback:
                 self.progress_callback(100, "Complete")
@@ -87,11 +162,15 @@ class WineProcessMonitor(QObject):
         """Run a process asynchronously - returns immediately"""
         self.progress_callback = progress_callback
         self.cancelled = False
-        self.stdout_data = []
-        self.stderr_data = []
+        self.stdout_buf = bytearray()
+        self._stdout_tail = b''
+        self.stderr_tail.clear()
+        self._progress_done = False
+        self._last_progress = 20
         
         try:
             self.process = QProcess()
+            self._start_in_new_session()
             
             # Set up environment
             if env:
@@ -123,6 +202,28 @@ class WineProcessMonitor(QObject):
         except Exception as e:
             self.process_finished.emit(False, f"Failed to start process: {e}")
     
+    def _start_in_new_session(self):
+        """Start the process as a session leader so cancel can signal everything Wine spawns"""
+        # setUnixProcessParameters is Qt 6.6+ but CreateNewSession only arrived in 6.7;
+        # older Qt just signals the Wine launcher as before
+        self._own_session = (
+            hasattr(self.process, 'setUnixProcessParameters')
+            and hasattr(QProcess.UnixProcessFlag, 'CreateNewSession')
+        )
+        if self._own_session:
+            self.process.setUnixProcessParameters(QProcess.UnixProcessFlag.CreateNewSession)
+    
+    def _signal_session(self, pid, sig):
+        """Signal the process's whole session - returns False if it wasn't started in its own"""
+        if not self._own_session or pid <= 0:
+            return False
+        try:
+            # The session leader's pid is also its process group id
+            os.killpg(pid, sig)
+        except ProcessLookupError:
+            pass
+        return True
+    
     def _on_process_started(self):
         """Handle process started"""
         if self.progress_callback:
@@ -152,12 +253,17 @@ class WineProcessMonitor(QObject):
     
     def _on_process_finished(self, exit_code, exit_status):
         """Handle process completion - runs in main thread via signal"""
-        print(f"DEBUG: Process finished with exit_code={exit_code}, exit_status={exit_status}")
+        logger.debug("Process finished with exit_code=%s, exit_status=%s", exit_code, exit_status)
         
         self._cleanup_timer()  # Stop timeout timer
         
-        stdout_text = '\n'.join(self.stdout_data)
-        stderr_text = '\n'.join(self.stderr_data)
+        # Output may end without a newline - report its last line too
+        if self._stdout_tail:
+            self._handle_stdout_lines((self._stdout_tail,))
+            self._stdout_tail = b''
+        
+        stdout_text = self.stdout_buf.decode('utf-8', 'replace')
+        stderr_text = '\n'.join(self.stderr_tail)
         
         if self.progress_callback:
             self.progress_callback(100, "Process completed")
@@ -180,11 +286,10 @@ class WineProcessMonitor(QObject):
         # 1. Exit code is 0 and normal exit, OR
         # 2. Has success indicator in output (Divine.exe quirk)
         if (exit_code == 0 and exit_status == QProcess.ExitStatus.NormalExit) or has_success_indicator:
-            print(f"DEBUG: Emitting process_finished(True, ...)")
             self.process_finished.emit(True, stdout_text)
         else:
             error_msg = stderr_text if stderr_text else f"Process failed with exit code {exit_code}"
-            print(f"DEBUG: Emitting process_finished(False, {error_msg})")
+            logger.debug("Process failed: %s", error_msg)
             self.process_finished.emit(False, error_msg)
         
         self._cleanup()
@@ -206,66 +311,108 @@ class WineProcessMonitor(QObject):
     def _on_stdout_ready(self):
         """Handle stdout data ready"""
         if self.process:
-            data = self.process.readAllStandardOutput().data().decode('utf-8')
-            lines = data.strip().split('\n')
-            for line in lines:
-                if line.strip():
-                    print(f"DEBUG STDOUT: {line.strip()}")
-                    self.stdout_data.append(line.strip())
-                    self._parse_progress(line.strip())
-                    logger.info(f"Wine: {line.strip()}")
+            data = self.process.readAllStandardOutput().data()
+            self.stdout_buf += data
+            
+            # Keep any partial trailing line until the rest of it arrives
+            lines = (self._stdout_tail + data).split(b'\n')
+            self._stdout_tail = lines.pop()
+            self._handle_stdout_lines(lines)
+    
+    def _handle_stdout_lines(self, lines):
+        """Report complete stdout lines as they arrive"""
+        debug_enabled = logger.isEnabledFor(logging.DEBUG)
+        for raw_line in lines:
+            line = raw_line.strip()
+            if line:
+                line = line.decode('utf-8', 'replace')
+                if debug_enabled:
+                    logger.debug("Wine stdout: %s", line)
+                self.line_received.emit(line)
+                self._parse_progress(line)
     
     def _on_stderr_ready(self):
         """Handle stderr data ready"""
         if self.process:
-            data = self.process.readAllStandardError().data().decode('utf-8')
-            lines = data.strip().split('\n')
-            for line in lines:
-                if line.strip():
+            data = self.process.readAllStandardError().data()
+            debug_enabled = logger.isEnabledFor(logging.DEBUG)
+            for raw_line in data.splitlines():
+                raw_line = raw_line.strip()
+                if raw_line:
+                    line = raw_line.decode('utf-8', 'replace')
+                    
                     # Log Wine errors instead of storing them
-                    if "err:" in line.lower() or "fixme:" in line.lower():
-                        logger.warning(f"Wine: {line.strip()}")
-                    print(f"DEBUG STDERR: {line.strip()}")
+                    raw_lower = raw_line.lower()
+                    if b"err:" in raw_lower or b"fixme:" in raw_lower:
+                        logger.warning("Wine: %s", line)
+                    else:
+                        self.stderr_tail.append(line)
+                        # Divine.exe may count files on stderr
+                        if not self._progress_done:
+                            self._parse_fraction_progress(line)
+                    if debug_enabled:
+                        logger.debug("Wine stderr: %s", line)
+    
+    def _report_progress(self, percentage, message):
+        """Send progress to the callback and to anything connected to progress_updated"""
+        if self.progress_callback:
+            self.progress_callback(percentage, message)
+        self.progress_updated.emit(percentage, message)
+    
+    def _parse_fraction_progress(self, line):
+        """Report a Divine.exe "current/total" counter as real progress - True if the line had one"""
+        match = PROGRESS_FRACTION_PATTERN.search(line)
+        if not match:
+            return False
+        
+        done, total = int(match.group(1)), int(match.group(2))
+        if total <= 0 or done > total:
+            return False
+        
+        percentage = FRACTION_PROGRESS_START + done * (FRACTION_PROGRESS_END - FRACTION_PROGRESS_START) // total
+        if percentage > self._last_progress:
+            self._last_progress = percentage
+            self._report_progress(percentage, line)
+        return True
     
     def _parse_progress(self, line):
         """Parse progress information from Divine.exe output"""
-        if self.progress_callback:
-            line_lower = line.lower()
-            
+        if not self._progress_done and not self._parse_fraction_progress(line):
             # Emit progress based on output patterns
-            if "opening" in line_lower or "reading" in line_lower:
-                self.progress_callback(10, "Opening PAK file...")
-            elif "extracting" in line_lower or "unpacking" in line_lower:
-                self.progress_callback(50, "Extracting files...")
-            elif "creating" in line_lower or "packing" in line_lower:
-                self.progress_callback(50, "Creating archive...")
-            elif "processing" in line_lower:
-                self.progress_callback(60, "Processing files...")
-            elif "writing" in line_lower:
-                self.progress_callback(70, "Writing files...")
-            elif "completed" in line_lower or "success" in line_lower or "done" in line_lower:
-                self.progress_callback(90, "Nearly complete...")
+            # Use the highest-priority keyword on the line, not the leftmost one
+            keyword = min(
+                (match.lastgroup for match in PROGRESS_PATTERN.finditer(line)),
+                key=PROGRESS_PRIORITY.__getitem__, default=None
+            )
+            if keyword:
+                self._report_progress(*PROGRESS_KEYWORDS[keyword])
+                # Nothing after a completion line can move progress further
+                self._progress_done = keyword in TERMINAL_PROGRESS_KEYWORDS
             else:
                 # For any other output, show intermediate progress
                 # This keeps the dialog responsive even without specific keywords
-                current_value = getattr(self, '_last_progress', 20)
+                current_value = self._last_progress
                 if current_value < 80:
                     self._last_progress = min(current_value + 5, 80)
-                    self.progress_callback(self._last_progress, "Processing...")
+                    self._report_progress(self._last_progress, "Processing...")
     
     def cancel(self):
         """Cancel the running operation"""
         self.cancelled = True
         if self.process and self.process.state() == QProcess.ProcessState.Running:
-            self.process.terminate()
+            pid = self.process.processId()
+            if not self._signal_session(pid, signal.SIGTERM):
+                self.process.terminate()
             
             # Set a timer to kill if it doesn't terminate
-            QTimer.singleShot(3000, lambda: self._force_kill())
+            QTimer.singleShot(3000, lambda: self._force_kill(pid))
         
         self._cleanup()
     
-    def _force_kill(self):
+    def _force_kill(self, pid):
         """Force kill if process doesn't terminate gracefully"""
+        if self._signal_session(pid, signal.SIGKILL):
+            return
         if self.process and self.process.state() == QProcess.ProcessState.Running:
             self.process.kill()
 
@@ -277,13 +424,17 @@ class WineEnvironmentManager:
         self.wine_path = wine_path
         self.wine_prefix = wine_prefix
         self._wine_info = None
+        self._process_env = None
         self._setup_paths()
     
     def _setup_paths(self):
         """Setup Wine paths for both development and app bundle, respecting user settings"""
+        # Read the settings used here in one go
+        user_settings = self._read_settings(("wine_path", "extracted_files_location"))
+        
         # First check user settings if available
         if self.settings_manager:
-            user_wine_path = self.settings_manager.get("wine_path")
+            user_wine_path = user_settings["wine_path"]
             if user_wine_path and os.path.isfile(user_wine_path) and os.access(user_wine_path, os.X_OK):
                 self.wine_path = user_wine_path
                 self.wine_prefix = self.wine_prefix or str(Path.home() / ".wine")
@@ -313,7 +464,7 @@ class WineEnvironmentManager:
         # Set wine prefix with user preference or default
         if self.settings_manager:
             # Use Documents folder for persistent storage in user settings
-            user_storage = self.settings_manager.get("extracted_files_location")
+            user_storage = user_settings["extracted_files_location"]
             if user_storage:
                 self.wine_prefix = self.wine_prefix or str(Path(user_storage) / "wine_prefix")
             else:
@@ -325,12 +476,37 @@ class WineEnvironmentManager:
         if not self.wine_path:
             self.wine_path = self._find_wine_executable(wine_dir)
     
+    def _read_settings(self, keys):
+        """Read several settings at once, using the manager's snapshot when it has one"""
+        if not self.settings_manager:
+            return dict.fromkeys(keys)
+        snapshot = getattr(self.settings_manager, "snapshot", None)
+        if snapshot:
+            return snapshot(keys)
+        return {key: self.settings_manager.get(key) for key in keys}
+    
     def validate_wine_installation(self):
         """Validate that Wine is properly installed and functional"""
         if not self.wine_path:
             return False, "Wine executable not found"
         
-        # Test Wine functionality
+        # Reuse a recent result - from any manager - while the Wine executable is unchanged
+        try:
+            wine_mtime = os.stat(self.wine_path).st_mtime
+        except OSError:
+            wine_mtime = None
+        
+        cached = _install_validations.get(self.wine_path)
+        if cached and cached[0] == wine_mtime and time.monotonic() - cached[1] < VALIDATION_CACHE_SECONDS:
+            self._wine_info = cached[3]
+            return cached[2]
+        
+        result = self._run_wine_version_check()
+        _install_validations[self.wine_path] = (wine_mtime, time.monotonic(), result, self._wine_info)
+        return result
+    
+    def _run_wine_version_check(self):
+        """Run `wine --version` to check that Wine is functional"""
         try:
             result = subprocess.run(
                 [self.wine_path, "--version"],
@@ -354,87 +530,129 @@ class WineEnvironmentManager:
     
     def _find_wine_executable(self, wine_dir=None):
         """Find Wine executable on the system"""
-        # First try bundled Wine locations
-        if wine_dir and wine_dir.exists():
-            wine_candidates = [
-                wine_dir / 'wine-9.0-osx64' / 'bin' / 'wine64',
-                wine_dir / 'wine-9.0-osx64' / 'bin' / 'wine',
-                wine_dir / 'bin' / 'wine64',
-                wine_dir / 'bin' / 'wine',
-                wine_dir / 'wine64',
-                wine_dir / 'wine',
-            ]
-            
-            for candidate in wine_candidates:
-                if candidate.exists() and candidate.is_file():
-                    # Make executable
-                    candidate.chmod(0o755)
-                    return str(candidate)
-        
-        # Check PATH
-        try:
-            for wine_name in ['wine64', 'wine']:
-                result = subprocess.run(["which", wine_name], capture_output=True, text=True)
-                if result.returncode == 0:
-                    return result.stdout.strip()
-        except:
-            pass
-        
-        # Check specific system paths
-        possible_paths = [
-            "/usr/local/bin/wine64",
-            "/usr/local/bin/wine",
-            "/opt/homebrew/bin/wine64",
-            "/opt/homebrew/bin/wine",
-            "/opt/local/bin/wine64",  # MacPorts
-            "/opt/local/bin/wine",
-            "/Applications/Wine.app/Contents/Resources/wine/bin/wine64",
-            "/Applications/Wine.app/Contents/Resources/wine/bin/wine",
-            "/Applications/Wineskin.app/Contents/Resources/wine/bin/wine64",
-            "/Applications/Wineskin.app/Contents/Resources/wine/bin/wine"
-        ]
-        
-        for path in possible_paths:
-            if os.path.isfile(path) and os.access(path, os.X_OK):
-                return path
-        
-        return None
+        return _locate_wine(str(wine_dir) if wine_dir else None, os.environ.get("PATH", os.defpath))
     
     def validate_wine_prefix(self):
         """Validate and optionally create Wine prefix"""
-        if not os.path.exists(self.wine_prefix):
+        cached = _prefix_validations.get(self.wine_prefix)
+        if cached and time.monotonic() - cached[0] < VALIDATION_CACHE_SECONDS:
+            return cached[1]
+        
+        result = self._check_wine_prefix()
+        _prefix_validations[self.wine_prefix] = (time.monotonic(), result)
+        return result
+    
+    def _check_wine_prefix(self):
+        """Check the Wine prefix for its essential directories"""
+        # One directory listing answers both the prefix and essential-directory checks
+        try:
+            with os.scandir(self.wine_prefix) as entries:
+                entry_names = {entry.name for entry in entries}
+        except FileNotFoundError:
             return False, f"Wine prefix not found: {self.wine_prefix}"
+        except OSError as e:
+            return False, f"Wine prefix not readable: {e}"
         
         # Check for essential Wine directories
-        essential_dirs = ["dosdevices", "drive_c"]
-        for dir_name in essential_dirs:
-            dir_path = os.path.join(self.wine_prefix, dir_name)
-            if not os.path.exists(dir_path):
+        for dir_name in WINE_PREFIX_ESSENTIAL_DIRS:
+            if dir_name not in entry_names:
                 return False, f"Wine prefix missing {dir_name} directory"
         
         return True, "Wine prefix validation successful"
     
+    def get_process_env(self):
+        """Get the environment for Wine subprocesses - shared, so copy it before modifying"""
+        # Rebuilt only when the prefix changes rather than copied for every launch
+        if self._process_env is None or self._process_env["WINEPREFIX"] != self.wine_prefix:
+            self._process_env = {**os.environ, "WINEPREFIX": self.wine_prefix}
+        return self._process_env
+    
     def initialize_wine_prefix(self):
         """Initialize Wine prefix if it doesn't exist"""
+        _prefix_validations.pop(self.wine_prefix, None)
         try:
             os.makedirs(self.wine_prefix, exist_ok=True)
             result = subprocess.run([
                 self.wine_path, 'wineboot', '--init'
             ], capture_output=True, text=True, timeout=60,
-            env={**os.environ, 'WINEPREFIX': self.wine_prefix})
+            env=self.get_process_env())
             
             if result.returncode == 0:
-                print("Wine prefix initialized successfully")
+                logger.info("Wine prefix initialized successfully")
                 return True
             else:
-                print(f"Wine prefix initialization failed: {result.stderr}")
+                logger.error("Wine prefix initialization failed: %s", result.stderr)
                 return False
         except Exception as e:
-            print(f"Error initializing Wine prefix: {e}")
+            logger.error("Error initializing Wine prefix: %s", e)
             return False
     
     def get_wine_info(self):
         """Get information about the Wine installation"""
         if not self._wine_info:
             self.validate_wine_installation()
-        return self._wine_info
\ No newline at end of file
+        return self._wine_info
+
+
+# Wine executables already found, keyed by (wine_dir, PATH); misses aren't stored, so
+# installing Wine or fixing the path during a session is picked up on the next lookup
+_located_wine = {}
+
+
+def _locate_wine(wine_dir, path_env):
+    """Locate a Wine executable, cached across WineEnvironmentManager instances"""
+    key = (wine_dir, path_env)
+    found = _located_wine.get(key)
+    if found is None:
+        found = _search_wine(wine_dir, path_env)
+        if found:
+            _located_wine[key] = found
+    return found
+
+
+def _search_wine(wine_dir, path_env):
+    """Search the bundled, PATH and system locations for a Wine executable"""
+    # First try bundled Wine locations
+    wine_dir = Path(wine_dir) if wine_dir else None
+    if wine_dir and wine_dir.exists():
+        wine_candidates = [
+            wine_dir / 'wine-9.0-osx64' / 'bin' / 'wine64',
+            wine_dir / 'wine-9.0-osx64' / 'bin' / 'wine',
+            wine_dir / 'bin' / 'wine64',
+            wine_dir / 'bin' / 'wine',
+            wine_dir / 'wine64',
+            wine_dir / 'wine',
+        ]
+        
+        for candidate in wine_candidates:
+            try:
+                st = candidate.stat()
+            except OSError:
+                continue
+            if not stat.S_ISREG(st.st_mode):
+                continue
+            
+            # Make executable, unless it already is (bundle resources may be read-only)
+            if not st.st_mode & 0o111:
+                try:
+                    candidate.chmod(st.st_mode | 0o755)
+                except OSError:
+                    continue
+            return str(candidate)
+    
+    # Check PATH
+    for wine_name in ['wine64', 'wine']:
+        found = shutil.which(wine_name, path=path_env)
+        if found:
+            return found
+    
+    # Check specific system paths - one stat per candidate covers existence, type and mode
+    for path in SYSTEM_WINE_PATHS:
+        try:
+            st = os.stat(path)
+        except OSError:
+            continue
+        if stat.S_ISREG(st.st_mode) and st.st_mode & 0o111:
+            return path
+    
+    return None
\ No newline at end of file
@@ -5,10 +5,17 @@ Handles GR2, DAE, GLTF, and GLB model format conversions with advanced options
 """
 
 import os
+import shutil
+import tempfile
 import threading
 from pathlib import Path
 
-from .wine_base_operations import BaseWineOperations, OperationResult, safe_file_operation
+from .wine_base_operations import (
+    BaseWineOperations, OperationResult, safe_file_operation, iter_dir_files
+)
+
+# Model formats Divine.exe can convert between
+SUPPORTED_MODEL_FORMATS = frozenset(("gr2", "dae", "glb", "gltf"))
 
 
 class ModelConverter(BaseWineOperations):
@@ -41,6 +48,9 @@ class ModelConverter(BaseWineOperations):
             "conform": False,
             "conform-copy": False
         }
+        
+        # Enabled default options, reused whenever no custom options are given
+        self._default_enabled_gr2 = tuple(key for key, value in self.default_gr2_options.items() if value)
     
     def get_supported_formats(self):
         """Get model conversion supported formats"""
@@ -63,9 +73,17 @@ class ModelConverter(BaseWineOperations):
         if not output_format:
             output_format = os.path.splitext(output_file)[1][1:].lower()
         
+        return self._convert_model_fast(
+            source_file, output_file, input_format, output_format,
+            gr2_options=gr2_options, conform_path=conform_path, progress_callback=progress_callback
+        )
+    
+    def _convert_model_fast(self, source_file, output_file, input_format, output_format,
+                            gr2_options=None, conform_path=None, progress_callback=None):
+        """Convert a single model whose (lowercase) formats are already known"""
+        
         # Validate formats
-        supported_formats = ["gr2", "dae", "glb", "gltf"]
-        if input_format not in supported_formats or output_format not in supported_formats:
+        if input_format not in SUPPORTED_MODEL_FORMATS or output_format not in SUPPORTED_MODEL_FORMATS:
             return OperationResult.error_result(
                 f"Unsupported format conversion: {input_format} -> {output_format}",
                 operation_type="convert_model"
@@ -115,17 +133,27 @@ class ModelConverter(BaseWineOperations):
             )
     
     def batch_convert_models(self, source_dir, output_dir, input_format, output_format,
-                           gr2_options=None, conform_path=None, progress_callback=None):
-        """Convert multiple model files in a directory"""
+                           gr2_options=None, conform_path=None, progress_callback=None,
+                           use_batch_action=True, max_workers=None):
+        """Convert multiple model files in a directory
+        
+        By default a single Divine.exe convert-models run handles the whole directory.
+        With use_batch_action=False every file gets its own convert-model run, with up
+        to max_workers of them in parallel.
+        """
         
         # Find all files with the specified input format
-        model_files = []
-        for root, dirs, files in os.walk(source_dir):
-            for file in files:
-                if file.lower().endswith(f'.{input_format.lower()}'):
-                    model_files.append(os.path.join(root, file))
+        input_suffix = f'.{input_format.lower()}'
+        model_files = (
+            entry.path for entry in iter_dir_files(source_dir) if entry.name.lower().endswith(input_suffix)
+        )
+        if use_batch_action:
+            model_count = sum(1 for _ in model_files)
+        else:
+            model_files = list(model_files)
+            model_count = len(model_files)
         
-        if not model_files:
+        if not model_count:
             return OperationResult.error_result(
                 f"No {input_format.upper()} files found in {source_dir}",
                 operation_type="batch_convert_models"
@@ -149,7 +177,13 @@ class ModelConverter(BaseWineOperations):
         self.ensure_directory_exists(output_dir)
         
         if progress_callback:
-            progress_callback(10, f"Starting batch conversion of {len(model_files)} files...")
+            progress_callback(10, f"Starting batch conversion of {model_count} files...")
+        
+        if not use_batch_action:
+            return self._parallel_batch(
+                model_files, source_dir, output_dir, input_format, output_format,
+                kwargs, progress_callback, max_workers
+            )
         
         success, output = self.run_divine_command(
             action="convert-models",
@@ -160,16 +194,15 @@ class ModelConverter(BaseWineOperations):
         )
         
         if success:
-            # Count converted files
-            converted_files = []
-            for root, dirs, files in os.walk(output_dir):
-                for file in files:
-                    if file.lower().endswith(f'.{output_format.lower()}'):
-                        converted_files.append(os.path.join(root, file))
+            # Divine.exe has no documented per-file log format, so count what it wrote
+            output_suffix = f'.{output_format.lower()}'
+            converted_count = sum(
+                1 for entry in iter_dir_files(output_dir) if entry.name.lower().endswith(output_suffix)
+            )
             
             return OperationResult.success_result(
-                f"Successfully converted {len(converted_files)} files from {input_format.upper()} to {output_format.upper()}",
-                data={"converted_count": len(converted_files), "output_dir": output_dir},
+                f"Successfully converted {converted_count} files from {input_format.upper()} to {output_format.upper()}",
+                data={"converted_count": converted_count, "output_dir": output_dir},
                 operation_type="batch_convert_models"
             )
         else:
@@ -178,6 +211,36 @@ class ModelConverter(BaseWineOperations):
                 operation_type="batch_convert_models"
             )
     
+    def _parallel_batch(self, model_files, source_dir, output_dir, input_format, output_format,
+                        kwargs, progress_callback=None, max_workers=None):
+        """Convert model files one Divine.exe process per file, several at a time"""
+        self._batch_cancelled.clear()
+        
+        # Mirror the source tree under output_dir
+        conversions = []
+        for source_file in model_files:
+            rel_stem = os.path.splitext(os.path.relpath(source_file, source_dir))[0]
+            conversions.append((source_file, os.path.join(output_dir, f"{rel_stem}.{output_format}")))
+        
+        total_files = len(conversions)
+        converted_count, failures = self.convert_files_parallel(
+            conversions, "convert-model", progress_callback, max_workers,
+            progress_range=(10, 85), **kwargs
+        )
+        
+        if failures:
+            return OperationResult.error_result(
+                f"Batch model conversion failed for {len(failures)}/{total_files} files",
+                data={"converted_count": converted_count, "failures": failures, "output_dir": output_dir},
+                operation_type="batch_convert_models"
+            )
+        
+        return OperationResult.success_result(
+            f"Successfully converted {converted_count} files from {input_format.upper()} to {output_format.upper()}",
+            data={"converted_count": converted_count, "output_dir": output_dir},
+            operation_type="batch_convert_models"
+        )
+    
     def conform_model_to_original(self, source_file, output_file, conform_path, 
                                  copy_mode=False, progress_callback=None):
         """Conform a model to match the structure of an original model"""
@@ -197,43 +260,55 @@ class ModelConverter(BaseWineOperations):
                               convert_to_format=None, progress_callback=None):
         """Extract a specific model from PAK and optionally convert it"""
         
-        if progress_callback:
-            progress_callback(20, f"Extracting {model_path} from PAK...")
-        
-        # First extract the specific file
-        success, output = self.run_divine_command(
-            action="extract-single-file",
-            source=self.mac_to_wine_path(pak_file),
-            destination=self.mac_to_wine_path(output_file),
-            packaged_path=model_path,
-            progress_callback=lambda p, m: progress_callback(p * 0.6, m) if progress_callback else None
-        )
+        output_stem, output_ext = os.path.splitext(output_file)
+        extracted_format = output_ext[1:]
+        needs_conversion = convert_to_format and convert_to_format != extracted_format
         
-        if not success:
-            return OperationResult.error_result(
-                f"Failed to extract {model_path}: {output}",
-                operation_type="extract_model_from_pak"
-            )
+        # An intermediate that is about to be converted goes to scratch space instead of the output folder
+        scratch_dir = tempfile.mkdtemp(prefix="macpak_model_") if needs_conversion else None
+        extracted_file = os.path.join(scratch_dir, os.path.basename(output_file)) if scratch_dir else output_file
         
-        # Convert if requested
-        if convert_to_format and convert_to_format != os.path.splitext(output_file)[1][1:]:
+        try:
             if progress_callback:
-                progress_callback(70, f"Converting to {convert_to_format.upper()}...")
+                progress_callback(20, f"Extracting {model_path} from PAK...")
             
-            converted_file = os.path.splitext(output_file)[0] + f".{convert_to_format}"
-            convert_result = self.convert_model(
-                output_file, converted_file,
-                output_format=convert_to_format,
-                progress_callback=lambda p, m: progress_callback(70 + p * 0.3, m) if progress_callback else None
+            # First extract the specific file
+            success, output = self.run_divine_command(
+                action="extract-single-file",
+                source=self.mac_to_wine_path(pak_file),
+                destination=self.mac_to_wine_path(extracted_file),
+                packaged_path=model_path,
+                progress_callback=lambda p, m: progress_callback(p * 0.6, m) if progress_callback else None
             )
             
-            if convert_result.success:
-                # Remove original extracted file if conversion successful
-                try:
-                    os.remove(output_file)
-                except:
-                    pass
-                output_file = converted_file
+            if not success:
+                return OperationResult.error_result(
+                    f"Failed to extract {model_path}: {output}",
+                    operation_type="extract_model_from_pak"
+                )
+            
+            # Convert if requested
+            if needs_conversion:
+                if progress_callback:
+                    progress_callback(70, f"Converting to {convert_to_format.upper()}...")
+                
+                converted_file = output_stem + f".{convert_to_format}"
+                convert_result = self.convert_model(
+                    extracted_file, converted_file,
+                    input_format=extracted_format.lower(),
+                    output_format=convert_to_format,
+                    progress_callback=lambda p, m: progress_callback(70 + p * 0.3, m) if progress_callback else None
+                )
+                
+                if convert_result.success:
+                    output_file = converted_file
+                else:
+                    # Keep the unconverted model as the result, as before
+                    self.ensure_directory_exists(os.path.dirname(output_file))
+                    shutil.move(extracted_file, output_file)
+        finally:
+            if scratch_dir:
+                shutil.rmtree(scratch_dir, ignore_errors=True)
         
         return OperationResult.success_result(
             f"Successfully extracted and processed {model_path}",
@@ -283,10 +358,11 @@ class ModelConverter(BaseWineOperations):
     
     def _build_gr2_options(self, custom_options=None):
         """Build GR2 options string for divine.exe"""
-        options = self.default_gr2_options.copy()
+        if not custom_options:
+            return list(self._default_enabled_gr2) if self._default_enabled_gr2 else None
         
-        if custom_options:
-            options.update(custom_options)
+        options = self.default_gr2_options.copy()
+        options.update(custom_options)
         
         # Only include options that are set to True
         enabled_options = [key for key, value in options.items() if value]
@@ -4,18 +4,74 @@ Loca Processor Module
 Handles .loca file operations and localization processing
 """
 
+import errno
+import functools
+import logging
 import os
 import shutil
 import tempfile
 from pathlib import Path
 
-from .wine_base_operations import BaseWineOperations, OperationResult, safe_file_operation
+from ..core.preview_tables import PRINTABLE_ASCII_TABLE
+from .wine_base_operations import (
+    BaseWineOperations, OperationResult, safe_file_operation, iter_files_with_ext, read_file_header
+)
 from .wine_pak_tools import WinePakTools
 
+logger = logging.getLogger(__name__)
+
+# Formats identified by the first four bytes of a .loca file
+LOCA_MAGIC_FORMATS = {
+    b'LSOF': 'Larian Binary',
+    b'LSFW': 'Larian Binary',
+    b'LOCA': 'Larian Localization',
+}
+
+
+@functools.lru_cache(maxsize=65536)
+def _analyze_loca_cached(loca_path, mtime_ns, file_size):
+    """Analyze a .loca file's header; keyed on mtime and size so edits miss the cache"""
+    # The size comes from the caller's stat, so empty files are never opened
+    header = read_file_header(loca_path, min(64, file_size)) if file_size else b''
+    
+    analysis = {
+        'file_path': loca_path,
+        'file_size': file_size,
+        'header_hex': header[:16].hex(),
+        'header_ascii': header[:32].translate(PRINTABLE_ASCII_TABLE).decode('ascii'),
+        'likely_format': 'unknown'
+    }
+    
+    # Check for binary magic numbers first, then text markers, lowercasing the header only once
+    likely_format = LOCA_MAGIC_FORMATS.get(header[:4])
+    if likely_format:
+        analysis['likely_format'] = likely_format
+    else:
+        lower_header = header.lower()
+        if b'xml' in lower_header or b'<' in header:
+            analysis['likely_format'] = 'XML-based'
+        elif b'content' in lower_header:
+            analysis['likely_format'] = 'Text-based'
+    
+    return analysis
+
+
+def _move_file(source, destination):
+    """Move a file without copying its data when source and destination share a filesystem"""
+    try:
+        os.replace(source, destination)
+    except OSError as e:
+        # Cross-device moves (EXDEV) can't be done as a rename - copy the data instead
+        if e.errno != errno.EXDEV:
+            raise
+        shutil.copy2(source, destination)
+
 
 class WineLocaProcessor(BaseWineOperations):
     """Specialized module for .loca file operations"""
     
+    completion_message = "Loca operation complete!"
+    
     def __init__(self, wine_env, lslib_path, settings_manager=None):
         super().__init__(wine_env, lslib_path, settings_manager)
     
@@ -28,75 +84,11 @@ class WineLocaProcessor(BaseWineOperations):
             'description': 'Localization file operations - .loca file processing for BG3'
         }
     
-    def mac_to_wine_path(self, mac_path):
-        """Convert Mac path to Wine path format"""
-        abs_path = os.path.abspath(mac_path)
-        wine_path = f"Z:{abs_path.replace('/', chr(92))}"
-        return wine_path
-    
-    def run_divine_command(self, action, source=None, destination=None, progress_callback=None, **kwargs):
-        """Run Divine.exe command specific to loca operations"""
-        # Build command
-        cmd = [self.wine_env.wine_path, self.lslib_path, "--action", action, "--game", "bg3"]
-        
-        if source:
-            cmd.extend(["--source", source])
-        if destination:
-            cmd.extend(["--destination", destination])
-        
-        # Add additional arguments
-        for key, value in kwargs.items():
-            cmd.extend([f"--{key.replace('_', '-')}", str(value)])
-        
-        # Setup environment
-        env = os.environ.copy()
-        env["WINEPREFIX"] = self.wine_env.wine_prefix
-        
-        # Use process monitor for real-time feedback
-        self.current_monitor = WineProcessMonitor()
-        
-        if progress_callback:
-            progress_callback(5, f"Starting {action}...")
-        
-        success, output = self.current_monitor.run_process(cmd, env, progress_callback)
-        
-        if progress_callback and success:
-            progress_callback(100, "Loca operation complete!")
-        
-        return success, output
-    
-    def cancel_current_operation(self):
-        """Cancel the currently running loca operation"""
-        if self.current_monitor:
-            self.current_monitor.cancel()
-    
     def analyze_loca_file_binary(self, loca_path):
         """Analyze .loca file structure without conversion"""
         try:
-            with open(loca_path, 'rb') as f:
-                header = f.read(64)
-                file_size = os.path.getsize(loca_path)
-            
-            analysis = {
-                'file_path': loca_path,
-                'file_size': file_size,
-                'header_hex': header[:16].hex(),
-                'header_ascii': ''.join(chr(b) if 32 <= b <= 126 else '.' for b in header[:32]),
-                'likely_format': 'unknown'
-            }
-            
-            # Check for common .loca signatures
-            if header.startswith(b'LSOF') or header.startswith(b'LSFW'):
-                analysis['likely_format'] = 'Larian Binary'
-            elif b'xml' in header.lower() or b'<' in header:
-                analysis['likely_format'] = 'XML-based'
-            elif b'content' in header.lower():
-                analysis['likely_format'] = 'Text-based'
-            elif header.startswith(b'LOCA'):
-                analysis['likely_format'] = 'Larian Localization'
-            
-            return analysis
-            
+            stat = os.stat(loca_path)
+            return dict(_analyze_loca_cached(loca_path, stat.st_mtime_ns, stat.st_size))
         except Exception as e:
             return {'file_path': loca_path, 'error': str(e)}
     
@@ -150,31 +142,44 @@ class WineLocaProcessor(BaseWineOperations):
         if not output_dir:
             output_dir = os.path.splitext(pak_path)[0] + "_loca_extracted"
         
-        # First extract the entire PAK to a temp location
+        # Let Divine.exe pick out the .loca files itself rather than dumping the whole PAK
+        success, output = self.run_divine_command(
+            action="extract-package",
+            source=self.mac_to_wine_path(pak_path),
+            destination=self.mac_to_wine_path(output_dir),
+            expression=loca_pattern
+        )
+        
+        if success:
+            return list(iter_files_with_ext(output_dir, '.loca'))
+        
+        logger.warning("Filtered .loca extraction failed, extracting full PAK: %s", output)
+        
+        # Fall back to extracting the entire PAK to a temp location
         temp_dir = pak_path + "_temp_extract"
-
-        pak_ops = PakOperations(self.wine_env, self.lslib_path, self.settings_manager)
         
-        success = pak_ops.extract_pak(pak_path, temp_dir)
+        success, output = self.run_divine_command(
+            action="extract-package",
+            source=self.mac_to_wine_path(pak_path),
+            destination=self.mac_to_wine_path(temp_dir)
+        )
         
         if success:
             # Find all .loca files
-            loca_files = []
-            for root, dirs, files in os.walk(temp_dir):
-                for file in files:
-                    if file.lower().endswith('.loca'):
-                        loca_files.append(os.path.join(root, file))
+            loca_files = list(iter_files_with_ext(temp_dir, '.loca'))
             
-            # Copy .loca files to output directory
+            # Move .loca files to output directory - the temp copy is deleted right after
+            extracted_loca_files = [
+                os.path.join(output_dir, os.path.relpath(loca_file, temp_dir)) for loca_file in loca_files
+            ]
+            
+            # Create each destination directory once rather than once per file
             os.makedirs(output_dir, exist_ok=True)
-            extracted_loca_files = []
+            for directory in sorted({os.path.dirname(dest_path) for dest_path in extracted_loca_files}):
+                os.makedirs(directory, exist_ok=True)
             
-            for loca_file in loca_files:
-                rel_path = os.path.relpath(loca_file, temp_dir)
-                dest_path = os.path.join(output_dir, rel_path)
-                os.makedirs(os.path.dirname(dest_path), exist_ok=True)
-                shutil.copy2(loca_file, dest_path)
-                extracted_loca_files.append(dest_path)
+            for loca_file, dest_path in zip(loca_files, extracted_loca_files):
+                _move_file(loca_file, dest_path)
             
             # Clean up temp directory
             shutil.rmtree(temp_dir, ignore_errors=True)
@@ -183,51 +188,22 @@ class WineLocaProcessor(BaseWineOperations):
         
         return []
     
-    def batch_convert_loca_to_xml(self, source_dir, output_dir, progress_callback=None):
+    def batch_convert_loca_to_xml(self, source_dir, output_dir, progress_callback=None, max_workers=None):
         """Convert multiple .loca files to XML format"""
-        loca_files = []
-        for root, dirs, files in os.walk(source_dir):
-            for file in files:
-                if file.lower().endswith('.loca'):
-                    loca_files.append(os.path.join(root, file))
-        
-        if not loca_files:
-            return False, "No .loca files found"
-        
-        os.makedirs(output_dir, exist_ok=True)
-        
-        successful_conversions = 0
-        total_files = len(loca_files)
-        
-        for i, loca_file in enumerate(loca_files):
-            if progress_callback:
-                progress_callback(
-                    int((i / total_files) * 90), 
-                    f"Converting {os.path.basename(loca_file)} ({i+1}/{total_files})"
-                )
-            
-            # Maintain directory structure
-            rel_path = os.path.relpath(loca_file, source_dir)
-            xml_file = os.path.join(output_dir, os.path.splitext(rel_path)[0] + '.xml')
-            
-            # Ensure output directory exists
-            os.makedirs(os.path.dirname(xml_file), exist_ok=True)
-            
-            if self.convert_loca_to_xml(loca_file, xml_file):
-                successful_conversions += 1
-        
-        if progress_callback:
-            progress_callback(100, f"Converted {successful_conversions}/{total_files} files")
-        
-        return successful_conversions == total_files, f"Converted {successful_conversions}/{total_files} files"
+        return self._batch_convert(source_dir, output_dir, '.loca', '.xml', progress_callback, max_workers,
+                                   output_format="xml")
     
-    def extract_and_convert_loca_from_pak(self, pak_path, output_dir=None, convert_to_xml=True, progress_callback=None):
+    def extract_and_convert_loca_from_pak(self, pak_path, output_dir=None, convert_to_xml=True, progress_callback=None,
+                                          max_workers=None):
         """Extract .loca files from PAK and optionally convert to XML"""
         if progress_callback:
             progress_callback(10, "Extracting .loca files from PAK...")
         
+        pak_stem = os.path.splitext(pak_path)[0]
+        extract_dir = output_dir or pak_stem + "_loca_extracted"
+        
         # Extract .loca files
-        loca_files = self.extract_loca_from_pak(pak_path, output_dir=output_dir)
+        loca_files = self.extract_loca_from_pak(pak_path, output_dir=extract_dir)
         
         if not loca_files:
             return False, "No .loca files found in PAK"
@@ -239,7 +215,7 @@ class WineLocaProcessor(BaseWineOperations):
             progress_callback(50, f"Converting {len(loca_files)} .loca files to XML...")
         
         # Convert to XML
-        xml_dir = output_dir + "_xml" if output_dir else os.path.splitext(pak_path)[0] + "_loca_xml"
+        xml_dir = output_dir + "_xml" if output_dir else pak_stem + "_loca_xml"
         
         def conversion_progress(percent, message):
             if progress_callback:
@@ -248,9 +224,10 @@ class WineLocaProcessor(BaseWineOperations):
                 progress_callback(int(scaled_percent), message)
         
         success, message = self.batch_convert_loca_to_xml(
-            output_dir or os.path.splitext(pak_path)[0] + "_loca_extracted",
+            extract_dir,
             xml_dir,
-            conversion_progress
+            conversion_progress,
+            max_workers
         )
         
         return success, f"Extracted and converted {len(loca_files)} .loca files"
@@ -4,17 +4,64 @@ Binary File Converter Module
 Handles LSX/LSF conversions and other binary file format operations
 """
 
+import contextlib
+import functools
+import logging
 import os
+import shutil
 import tempfile
 from pathlib import Path
 
-from .wine_base_operations import BaseWineOperations, OperationResult, safe_file_operation
+from ..core.preview_tables import PRINTABLE_ASCII_TABLE
+from .wine_base_operations import (
+    BaseWineOperations, OperationResult, safe_file_operation, build_divine_command, read_file_header
+)
 from .wine_environment import WineProcessMonitor
 
+logger = logging.getLogger(__name__)
+
+# Formats identified by the first four bytes of a file
+BINARY_MAGIC_FORMATS = {
+    b'LSOF': 'LSF (Larian Binary)',
+    b'LSFW': 'LSF (Larian Binary)',
+    b'LSPK': 'PAK File',
+}
+
+# Where content-mode conversions stage their input for Divine.exe. Point MAC_PAK_TMPFS at a
+# RAM disk (e.g. one made with `diskutil erasevolume APFS MacPakTmp $(hdiutil attach -nomount ram://1048576)`)
+# so these short-lived files never hit the SSD; None uses the system temp folder.
+CONTENT_TEMP_DIR = os.environ.get("MAC_PAK_TMPFS") or None
+
+
+@functools.lru_cache(maxsize=65536)
+def _analyze_binary_cached(file_path, mtime_ns, file_size):
+    """Analyze a binary file's header; keyed on mtime and size so edits miss the cache"""
+    # The size comes from the caller's stat, so empty files are never opened
+    header = read_file_header(file_path, min(64, file_size)) if file_size else b''
+    
+    analysis = {
+        'file_path': file_path,
+        'file_size': file_size,
+        'header_hex': header[:16].hex(),
+        'header_ascii': header[:32].translate(PRINTABLE_ASCII_TABLE).decode('ascii'),
+        'likely_format': 'unknown'
+    }
+    
+    # Check for binary magic numbers first, then LSX markers anywhere in the header
+    likely_format = BINARY_MAGIC_FORMATS.get(header[:4])
+    if likely_format:
+        analysis['likely_format'] = likely_format
+    elif b'<?xml' in header or b'<save' in header:
+        analysis['likely_format'] = 'LSX (XML)'
+    
+    return analysis
+
 
 class WineLSTools(BaseWineOperations):
     """Specialized module for binary file format conversions"""
     
+    completion_message = "Conversion complete!"
+    
     def __init__(self, wine_env, lslib_path, settings_manager=None):
         super().__init__(wine_env, lslib_path, settings_manager)
         self.current_monitor = None
@@ -28,12 +75,6 @@ class WineLSTools(BaseWineOperations):
             'description': 'Binary file conversions - LSX/LSF format conversions for BG3'
         }
     
-    def mac_to_wine_path(self, mac_path):
-        """Convert Mac path to Wine path format"""
-        abs_path = os.path.abspath(mac_path)
-        wine_path = f"Z:{abs_path.replace('/', chr(92))}"
-        return wine_path
-    
     # ============================================================================
     # ASYNC METHODS - Use these for UI operations (non-blocking)
     # ============================================================================
@@ -48,17 +89,11 @@ class WineLSTools(BaseWineOperations):
         wine_source_path = self.mac_to_wine_path(source_path)
         wine_dest_path = self.mac_to_wine_path(dest_path)
         
-        cmd = [
-            self.wine_env.wine_path,
-            self.lslib_path,
-            "--action", "convert-resource",
-            "--game", "bg3",
-            "--source", wine_source_path,
-            "--destination", wine_dest_path
-        ]
+        cmd = build_divine_command(
+            self.wine_env.wine_path, self.lslib_path, "convert-resource", wine_source_path, wine_dest_path
+        )
         
-        env = os.environ.copy()
-        env["WINEPREFIX"] = self.wine_env.wine_prefix
+        env = self.wine_env.get_process_env()
         
         # Create monitor and start async
         self.current_monitor = WineProcessMonitor()
@@ -84,53 +119,32 @@ class WineLSTools(BaseWineOperations):
     # SYNCHRONOUS METHODS - Use these for batch/scripting (blocking)
     # ============================================================================
     
-    def run_divine_command(self, action, source=None, destination=None, progress_callback=None, **kwargs):
-        """Run Divine.exe command specific to binary conversions - SYNCHRONOUS"""
-        # Build command
-        cmd = [self.wine_env.wine_path, self.lslib_path, "--action", action, "--game", "bg3"]
-        
-        if source:
-            cmd.extend(["--source", source])
-        if destination:
-            cmd.extend(["--destination", destination])
-        
-        # Add additional arguments
-        for key, value in kwargs.items():
-            cmd.extend([f"--{key.replace('_', '-')}", str(value)])
-        
-        # Setup environment
-        env = os.environ.copy()
-        env["WINEPREFIX"] = self.wine_env.wine_prefix
+    def _write_temp_source(self, data, suffix):
+        """Write content-mode input to a temp file for Divine.exe, removing it if the write fails"""
+        if isinstance(data, str):
+            data = data.encode('utf-8')
         
-        # Use process monitor for real-time feedback
-        self.current_monitor = WineProcessMonitor()
-        
-        if progress_callback:
-            progress_callback(5, f"Starting {action}...")
-        
-        success, output = self.current_monitor.run_process(cmd, env, progress_callback)
-        
-        if progress_callback and success:
-            progress_callback(100, "Conversion complete!")
-        
-        return success, output
-    
-    def cancel_current_operation(self):
-        """Cancel the currently running conversion operation"""
-        if self.current_monitor:
-            self.current_monitor.cancel()
+        temp_fd, temp_path = tempfile.mkstemp(suffix=suffix, dir=CONTENT_TEMP_DIR)
+        try:
+            try:
+                # Raw writes - os.write may stop short, so continue from where it left off
+                view = memoryview(data)
+                while view:
+                    view = view[os.write(temp_fd, view):]
+            finally:
+                os.close(temp_fd)
+        except BaseException:
+            os.unlink(temp_path)
+            raise
+        return temp_path
     
     def convert_lsx_to_lsf(self, source, lsf_file, is_content=False, progress_callback=None):
         """Convert LSX file or content to LSF format using divine.exe - SYNCHRONOUS"""
         if is_content:
             # Create temporary file from content
-            temp_fd, temp_lsx_file = tempfile.mkstemp(suffix=".lsx")
             try:
-                with os.fdopen(temp_fd, 'w') as f:
-                    f.write(source)
-                source_file = temp_lsx_file
-            except Exception as e:
-                os.close(temp_fd)
+                source_file = self._write_temp_source(source, ".lsx")
+            except OSError:
                 return False
         else:
             source_file = source
@@ -147,30 +161,24 @@ class WineLSTools(BaseWineOperations):
             )
             
             if success and os.path.exists(lsf_file):
-                print(f"Successfully converted to {lsf_file}")
+                logger.info("Successfully converted to %s", lsf_file)
                 return True
             else:
-                print(f"Failed to convert: {output}")
+                logger.warning("Failed to convert: %s", output)
                 return False
         finally:
             # Clean up temporary file if created
-            if is_content and 'temp_lsx_file' in locals():
-                try:
-                    os.remove(temp_lsx_file)
-                except:
-                    pass
+            if is_content:
+                with contextlib.suppress(OSError):
+                    os.unlink(source_file)
     
     def convert_lsf_to_lsx(self, source, lsx_file, is_content=False, progress_callback=None):
         """Convert LSF file or content to LSX format using divine.exe - SYNCHRONOUS"""
         if is_content:
             # Create temporary file from content
-            temp_fd, temp_lsf_file = tempfile.mkstemp(suffix=".lsf")
             try:
-                with os.fdopen(temp_fd, 'wb') as f:
-                    f.write(source if isinstance(source, bytes) else source.encode('utf-8'))
-                source_file = temp_lsf_file
-            except Exception as e:
-                os.close(temp_fd)
+                source_file = self._write_temp_source(source, ".lsf")
+            except OSError:
                 return False
         else:
             source_file = source
@@ -187,119 +195,123 @@ class WineLSTools(BaseWineOperations):
             )
             
             if success and os.path.exists(lsx_file):
-                print(f"Successfully converted to {lsx_file}")
+                logger.info("Successfully converted to %s", lsx_file)
                 return True
             else:
-                print(f"Failed to convert: {output}")
+                logger.warning("Failed to convert: %s", output)
                 return False
         finally:
             # Clean up temporary file if created
-            if is_content and 'temp_lsf_file' in locals():
-                try:
-                    os.remove(temp_lsf_file)
-                except:
-                    pass
+            if is_content:
+                with contextlib.suppress(OSError):
+                    os.unlink(source_file)
     
-    def batch_convert_lsx_to_lsf(self, source_dir, output_dir, progress_callback=None):
-        """Convert multiple LSX files to LSF format - SYNCHRONOUS"""
-        lsx_files = []
-        for root, dirs, files in os.walk(source_dir):
-            for file in files:
-                if file.lower().endswith('.lsx'):
-                    lsx_files.append(os.path.join(root, file))
+    def _convert_resource_tree(self, source_dir, output_dir, input_format, output_format, progress_callback=None):
+        """Convert every resource under source_dir with one Divine.exe run - SYNCHRONOUS"""
+        if progress_callback:
+            progress_callback(5, f"Converting {input_format.upper()} files to {output_format.upper()}...")
         
-        if not lsx_files:
-            return False, "No LSX files found"
+        success, output = self.run_divine_command(
+            action="convert-resources",
+            source=self.mac_to_wine_path(source_dir),
+            destination=self.mac_to_wine_path(output_dir),
+            progress_callback=progress_callback,
+            input_format=input_format,
+            output_format=output_format
+        )
         
-        os.makedirs(output_dir, exist_ok=True)
+        if not success:
+            logger.warning("Batch conversion failed, converting files individually: %s", output)
+        return success
+    
+    def convert_many(self, pairs, input_format="lsx", output_format="lsf", progress_callback=None,
+                     max_workers=None):
+        """Convert (source, destination) file pairs with one Divine.exe run - SYNCHRONOUS
         
-        successful_conversions = 0
-        total_files = len(lsx_files)
+        The sources are staged into one folder for convert-resources; anything that run doesn't
+        produce is retried one file at a time. Returns (converted_count, failures), where failures
+        maps each source path that wasn't converted, as given, to its error.
+        """
+        pairs = [(source, os.path.abspath(destination)) for source, destination in pairs]
+        if not pairs:
+            return 0, {}
         
-        for i, lsx_file in enumerate(lsx_files):
-            if progress_callback:
-                progress_callback(
-                    int((i / total_files) * 90), 
-                    f"Converting {os.path.basename(lsx_file)} ({i+1}/{total_files})"
-                )
+        self._batch_cancelled.clear()
+        failures = {}
+        staging_dir = tempfile.mkdtemp(prefix="macpak_convert_", dir=CONTENT_TEMP_DIR)
+        try:
+            staged_input = os.path.join(staging_dir, "in")
+            staged_output = os.path.join(staging_dir, "out")
+            os.mkdir(staged_input)
             
-            # Maintain directory structure
-            rel_path = os.path.relpath(lsx_file, source_dir)
-            lsf_file = os.path.join(output_dir, os.path.splitext(rel_path)[0] + '.lsf')
+            # Hard links are free on the same volume; copy when the source lives elsewhere
+            staged = []
+            for index, (source, destination) in enumerate(pairs):
+                staged_file = os.path.join(staged_input, f"{index}.{input_format}")
+                try:
+                    try:
+                        os.link(source, staged_file)
+                    except OSError:
+                        shutil.copyfile(source, staged_file)
+                except OSError as e:
+                    failures[source] = str(e)
+                    continue
+                staged.append((index, source, destination))
             
-            # Ensure output directory exists
-            os.makedirs(os.path.dirname(lsf_file), exist_ok=True)
+            if staged:
+                self._convert_resource_tree(staged_input, staged_output, input_format, output_format,
+                                            progress_callback)
             
-            if self.convert_lsx_to_lsf(lsx_file, lsf_file):
-                successful_conversions += 1
+            remaining = []
+            converted_count = 0
+            ensured_dirs = set()
+            for index, source, destination in staged:
+                staged_result = os.path.join(staged_output, f"{index}.{output_format}")
+                if os.path.exists(staged_result):
+                    # Most pairs share a few output folders - create each once per batch
+                    destination_dir = os.path.dirname(destination)
+                    if destination_dir not in ensured_dirs:
+                        os.makedirs(destination_dir, exist_ok=True)
+                        ensured_dirs.add(destination_dir)
+                    shutil.move(staged_result, destination)
+                    converted_count += 1
+                else:
+                    remaining.append((source, destination))
+        finally:
+            shutil.rmtree(staging_dir, ignore_errors=True)
+        
+        if remaining and self._batch_cancelled.is_set():
+            failures.update((source, "Cancelled") for source, _ in remaining)
+        elif remaining:
+            retried_count, retry_failures = self.convert_files_parallel_by_source(
+                remaining, progress_callback=progress_callback, max_workers=max_workers
+            )
+            converted_count += retried_count
+            failures.update(retry_failures)
         
         if progress_callback:
-            progress_callback(100, f"Converted {successful_conversions}/{total_files} files")
+            progress_callback(100, f"Converted {converted_count}/{len(pairs)} files")
         
-        return successful_conversions == total_files, f"Converted {successful_conversions}/{total_files} files"
+        return converted_count, failures
     
-    def batch_convert_lsf_to_lsx(self, source_dir, output_dir, progress_callback=None):
+    def batch_convert_lsx_to_lsf(self, source_dir, output_dir, progress_callback=None, max_workers=None,
+                                 use_batch_action=True):
+        """Convert multiple LSX files to LSF format - SYNCHRONOUS"""
+        # A single convert-resources run pays Wine startup once for the whole tree
+        tree_converter = self._convert_resource_tree if use_batch_action else None
+        return self._batch_convert(source_dir, output_dir, '.lsx', '.lsf', progress_callback, max_workers, tree_converter)
+    
+    def batch_convert_lsf_to_lsx(self, source_dir, output_dir, progress_callback=None, max_workers=None,
+                                 use_batch_action=True):
         """Convert multiple LSF files to LSX format - SYNCHRONOUS"""
-        lsf_files = []
-        for root, dirs, files in os.walk(source_dir):
-            for file in files:
-                if file.lower().endswith('.lsf'):
-                    lsf_files.append(os.path.join(root, file))
-        
-        if not lsf_files:
-            return False, "No LSF files found"
-        
-        os.makedirs(output_dir, exist_ok=True)
-        
-        successful_conversions = 0
-        total_files = len(lsf_files)
-        
-        for i, lsf_file in enumerate(lsf_files):
-            if progress_callback:
-                progress_callback(
-                    int((i / total_files) * 90), 
-                    f"Converting {os.path.basename(lsf_file)} ({i+1}/{total_files})"
-                )
-            
-            # Maintain directory structure
-            rel_path = os.path.relpath(lsf_file, source_dir)
-            lsx_file = os.path.join(output_dir, os.path.splitext(rel_path)[0] + '.lsx')
-            
-            # Ensure output directory exists
-            os.makedirs(os.path.dirname(lsx_file), exist_ok=True)
-            
-            if self.convert_lsf_to_lsx(lsf_file, lsx_file):
-                successful_conversions += 1
-        
-        if progress_callback:
-            progress_callback(100, f"Converted {successful_conversions}/{total_files} files")
-        
-        return successful_conversions == total_files, f"Converted {successful_conversions}/{total_files} files"
+        # A single convert-resources run pays Wine startup once for the whole tree
+        tree_converter = self._convert_resource_tree if use_batch_action else None
+        return self._batch_convert(source_dir, output_dir, '.lsf', '.lsx', progress_callback, max_workers, tree_converter)
     
     def analyze_binary_file(self, file_path):
         """Analyze binary file structure and format"""
         try:
-            with open(file_path, 'rb') as f:
-                header = f.read(64)
-                file_size = os.path.getsize(file_path)
-            
-            analysis = {
-                'file_path': file_path,
-                'file_size': file_size,
-                'header_hex': header[:16].hex(),
-                'header_ascii': ''.join(chr(b) if 32 <= b <= 126 else '.' for b in header[:32]),
-                'likely_format': 'unknown'
-            }
-            
-            # Check for LSF/LSX signatures
-            if header.startswith(b'LSOF') or header.startswith(b'LSFW'):
-                analysis['likely_format'] = 'LSF (Larian Binary)'
-            elif b'<?xml' in header[:64] or b'<save' in header[:64]:
-                analysis['likely_format'] = 'LSX (XML)'
-            elif header.startswith(b'LSPK'):
-                analysis['likely_format'] = 'PAK File'
-            
-            return analysis
-            
+            stat = os.stat(file_path)
+            return dict(_analyze_binary_cached(file_path, stat.st_mtime_ns, stat.st_size))
         except Exception as e:
-            return {'file_path': file_path, 'error': str(e)}
\ No newline at end of file
+            return {'file_path': file_path, 'error': str(e)}
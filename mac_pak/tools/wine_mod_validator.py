@@ -4,10 +4,39 @@ Mod Validator Module
 Handles BG3 mod structure validation and metadata parsing
 """
 
+import copy
 import os
 import xml.etree.ElementTree as ET
 from pathlib import Path
 
+from .wine_base_operations import iter_dir_files
+
+# Mods/ subfolders holding game content rather than a custom mod
+GAME_CONTENT_FOLDERS = frozenset(("GustavDev", "Gustav", "Shared", "Engine", "Game", "Core"))
+
+# Distinct file types listed per mod before the folder walk stops early
+MAX_REPORTED_FILE_TYPES = 20
+
+# Files counted in an optional folder before reporting "N+ files"
+MAX_COUNTED_FILES = 10000
+
+# Optional top-level mod folders and what they hold
+OPTIONAL_MOD_FOLDERS = {
+    'Public': 'Game assets and resources',
+    'Localization': 'Translation files',
+    'Generated': 'Auto-generated content'
+}
+
+# Map common meta.lsx attribute IDs to readable names
+META_FIELD_MAPPING = {
+    'Name': 'name',
+    'UUID': 'uuid',
+    'Version': 'version',
+    'Author': 'author',
+    'Description': 'description',
+    'ModuleType': 'module_type'
+}
+
 
 class WineModValidator:
     """Specialized module for mod validation and metadata operations"""
@@ -16,8 +45,57 @@ class WineModValidator:
         self.wine_env = wine_env
         self.lslib_path = lslib_path
         self.settings_manager = settings_manager
+        self._validation_cache = {}
+    
+    def _mod_dir_signature(self, mod_dir):
+        """Newest mtime across mod_dir, Mods/ and its entries, their meta.lsx files and the optional folders
+        
+        Kept shallow so a cache hit stays cheap on large extracted trees: a file added deep inside
+        a folder doesn't change it, so call invalidate_validation_cache after such edits. Returns
+        None if the folder can't be read, so the result isn't cached.
+        """
+        mods_path = os.path.join(mod_dir, "Mods")
+        try:
+            newest = os.stat(mods_path).st_mtime_ns
+            with os.scandir(mods_path) as entries:
+                for entry in entries:
+                    newest = max(newest, entry.stat().st_mtime_ns)
+                    # meta.lsx can be edited in place without touching its folder's mtime
+                    if entry.is_dir():
+                        try:
+                            newest = max(newest, os.stat(os.path.join(entry.path, "meta.lsx")).st_mtime_ns)
+                        except FileNotFoundError:
+                            pass
+            
+            with os.scandir(mod_dir) as entries:
+                for entry in entries:
+                    if entry.name in OPTIONAL_MOD_FOLDERS:
+                        newest = max(newest, entry.stat().st_mtime_ns)
+            newest = max(newest, os.stat(mod_dir).st_mtime_ns)
+        except OSError:
+            return None
+        return newest
+    
+    def invalidate_validation_cache(self, mod_dir=None):
+        """Forget the cached validation for mod_dir, or for every folder if None"""
+        if mod_dir is None:
+            self._validation_cache.clear()
+        else:
+            self._validation_cache.pop(mod_dir, None)
     
     def validate_mod_structure(self, mod_dir):
+        """Validate BG3 mod folder structure, reusing the last result while the folder is unchanged"""
+        signature = self._mod_dir_signature(mod_dir)
+        cached = self._validation_cache.get(mod_dir)
+        if signature is not None and cached and cached[0] == signature:
+            return copy.deepcopy(cached[1])
+        
+        validation = self._validate_mod_structure(mod_dir)
+        if signature is not None:
+            self._validation_cache[mod_dir] = (signature, copy.deepcopy(validation))
+        return validation
+    
+    def _validate_mod_structure(self, mod_dir):
         """Validate BG3 mod folder structure with detailed analysis"""
         validation = {
             'valid': True,
@@ -57,9 +135,8 @@ class WineModValidator:
         meta_found = False
         
         try:
-            mod_subfolders = [d for d in os.listdir(mods_path) if os.path.isdir(os.path.join(mods_path, d))]
-            game_content_folders = {"GustavDev", "Gustav", "Shared", "Engine", "Game", "Core"}
-            
+            with os.scandir(mods_path) as entries:
+                mod_subfolders = [entry.name for entry in entries if entry.is_dir()]
             if not mod_subfolders:
                 validation['warnings'].append("No mod subfolders found in Mods/")
                 return
@@ -67,7 +144,7 @@ class WineModValidator:
             for subfolder in mod_subfolders:
                 subfolder_path = os.path.join(mods_path, subfolder)
                 
-                if subfolder in game_content_folders:
+                if subfolder in GAME_CONTENT_FOLDERS:
                     validation['structure'].append(f"Game content folder: Mods/{subfolder}/")
                     self._analyze_game_content_folder(subfolder_path, subfolder, validation)
                     continue
@@ -117,39 +194,63 @@ class WineModValidator:
         """Validate contents of a custom mod folder"""
         # Check for common mod file types
         file_types_found = set()
+        top_level_files = set()
+        subfolders = []
         
-        for root, dirs, files in os.walk(mod_folder_path):
-            for file in files:
-                ext = os.path.splitext(file)[1].lower()
-                file_types_found.add(ext)
+        # The top level gives the important files; only descend if there are subfolders
+        with os.scandir(mod_folder_path) as entries:
+            for entry in entries:
+                if entry.is_dir(follow_symlinks=False):
+                    subfolders.append(entry.path)
+                elif entry.is_file():
+                    top_level_files.add(entry.name.lower())
+                    file_types_found.add(os.path.splitext(entry.name)[1].lower())
+        
+        # The file type list is diagnostic, so stop walking once it is long enough
+        truncated = False
+        for subfolder in subfolders:
+            for entry in iter_dir_files(subfolder):
+                if len(file_types_found) >= MAX_REPORTED_FILE_TYPES:
+                    truncated = True
+                    break
+                file_types_found.add(os.path.splitext(entry.name)[1].lower())
+            if truncated:
+                break
         
         # Report found file types
         if file_types_found:
-            validation['structure'].append(f"File types in {mod_name}: {', '.join(sorted(file_types_found))}")
+            file_types = ', '.join(sorted(file_types_found))
+            if truncated:
+                file_types += ', ...'
+            validation['structure'].append(f"File types in {mod_name}: {file_types}")
         
         # Check for specific important files
         important_files = ["meta.lsx"]
         for important_file in important_files:
-            file_path = os.path.join(mod_folder_path, important_file)
-            if not os.path.exists(file_path):
+            if important_file.lower() not in top_level_files:
                 validation['warnings'].append(f"Important file missing in {mod_name}: {important_file}")
     
+    def _count_files_fast(self, folder_path, limit=MAX_COUNTED_FILES):
+        """Count files under folder_path, stopping at limit since the count is only informational"""
+        file_count = 0
+        for _ in iter_dir_files(folder_path):
+            file_count += 1
+            if file_count >= limit:
+                break
+        return file_count
+    
     def _check_optional_folders(self, mod_dir, validation):
         """Check for optional folders and their contents"""
-        optional_folders = {
-            'Public': 'Game assets and resources',
-            'Localization': 'Translation files',
-            'Generated': 'Auto-generated content'
-        }
-        
-        for folder, description in optional_folders.items():
+        for folder, description in OPTIONAL_MOD_FOLDERS.items():
             folder_path = os.path.join(mod_dir, folder)
             if os.path.exists(folder_path):
                 validation['structure'].append(f"Found {folder}/ ({description})")
                 
                 # Count files in optional folders
-                file_count = sum(len(files) for _, _, files in os.walk(folder_path))
-                if file_count > 0:
+                file_count = self._count_files_fast(folder_path)
+                if file_count >= MAX_COUNTED_FILES:
+                    validation['structure'].append(f"  {MAX_COUNTED_FILES}+ files in {folder}/")
+                elif file_count > 0:
                     validation['structure'].append(f"  {file_count} files in {folder}/")
                 else:
                     validation['warnings'].append(f"{folder}/ is empty")
@@ -175,29 +276,16 @@ class WineModValidator:
     def _parse_meta_lsx(self, meta_path):
         """Parse meta.lsx file to extract mod metadata"""
         try:
-            tree = ET.parse(meta_path)
-            root = tree.getroot()
-            
             metadata = {}
             
-            # Extract common metadata fields
-            for node in root.iter():
-                if node.tag == 'attribute' and 'id' in node.attrib:
-                    attr_id = node.attrib['id']
-                    value = node.attrib.get('value', '')
-                    
-                    # Map common attribute IDs to readable names
-                    field_mapping = {
-                        'Name': 'name',
-                        'UUID': 'uuid',
-                        'Version': 'version',
-                        'Author': 'author',
-                        'Description': 'description',
-                        'ModuleType': 'module_type'
-                    }
-                    
-                    if attr_id in field_mapping:
-                        metadata[field_mapping[attr_id]] = value
+            # Stream the file, freeing each element once it has been read. Later attributes
+            # (the ModuleInfo node) override earlier ones (Dependencies), so read to the end
+            for _, node in ET.iterparse(meta_path):
+                if node.tag == 'attribute':
+                    field = META_FIELD_MAPPING.get(node.attrib.get('id'))
+                    if field:
+                        metadata[field] = node.attrib.get('value', '')
+                node.clear()
             
             return metadata
             
@@ -255,10 +343,39 @@ class WineModValidator:
         
         return summary
     
-    def compare_mod_versions(self, mod_dir1, mod_dir2):
-        """Compare two mod directories for differences"""
-        summary1 = self.get_mod_summary(mod_dir1)
-        summary2 = self.get_mod_summary(mod_dir2)
+    def get_metadata_only(self, mod_dir):
+        """Read meta.lsx metadata for each custom mod in Mods/ without validating the structure"""
+        metadata = {}
+        
+        try:
+            with os.scandir(os.path.join(mod_dir, "Mods")) as entries:
+                mod_folders = [
+                    entry for entry in entries if entry.is_dir() and entry.name not in GAME_CONTENT_FOLDERS
+                ]
+        except OSError:
+            return metadata
+        
+        for entry in mod_folders:
+            meta_path = os.path.join(entry.path, "meta.lsx")
+            if os.path.isfile(meta_path):
+                mod_metadata = self._parse_meta_lsx(meta_path)
+                if mod_metadata:
+                    metadata[entry.name] = mod_metadata
+        
+        return metadata
+    
+    def compare_mod_versions(self, mod_dir1, mod_dir2, include_structure=False):
+        """Compare two mod directories for differences
+        
+        Only meta.lsx files are read unless include_structure is set, in which case
+        both mods are fully validated and summarized.
+        """
+        if include_structure:
+            summary1 = self.get_mod_summary(mod_dir1)
+            summary2 = self.get_mod_summary(mod_dir2)
+        else:
+            summary1 = {'path': mod_dir1, 'metadata': self.get_metadata_only(mod_dir1)}
+            summary2 = {'path': mod_dir2, 'metadata': self.get_metadata_only(mod_dir2)}
         
         comparison = {
             'mod1': summary1,
@@ -270,18 +387,17 @@ class WineModValidator:
         meta1 = summary1.get('metadata', {})
         meta2 = summary2.get('metadata', {})
         
-        all_mod_names = set(meta1.keys()) | set(meta2.keys())
+        for mod_name in sorted(meta1.keys() & meta2.keys()):
+            # Compare versions if available
+            ver1 = meta1[mod_name].get('version', 'Unknown')
+            ver2 = meta2[mod_name].get('version', 'Unknown')
+            if ver1 != ver2:
+                comparison['differences'].append(f"Version difference in {mod_name}: {ver1} vs {ver2}")
         
-        for mod_name in all_mod_names:
-            if mod_name in meta1 and mod_name in meta2:
-                # Compare versions if available
-                ver1 = meta1[mod_name].get('version', 'Unknown')
-                ver2 = meta2[mod_name].get('version', 'Unknown')
-                if ver1 != ver2:
-                    comparison['differences'].append(f"Version difference in {mod_name}: {ver1} vs {ver2}")
-            elif mod_name in meta1:
-                comparison['differences'].append(f"Mod {mod_name} only in first directory")
-            else:
-                comparison['differences'].append(f"Mod {mod_name} only in second directory")
+        for mod_name in sorted(meta1.keys() - meta2.keys()):
+            comparison['differences'].append(f"Mod {mod_name} only in first directory")
+        
+        for mod_name in sorted(meta2.keys() - meta1.keys()):
+            comparison['differences'].append(f"Mod {mod_name} only in second directory")
         
-        return comparison
\ No newline at end of file
+        return comparison
@@ -5,35 +5,245 @@ Handles all PAK file creation/export,
 extraction/compression, and analysis operations
 """
 
+import functools
+import hashlib
+import json
 import os
+import re
+import struct
+import tempfile
 import threading
+from collections import Counter
+from concurrent.futures import ThreadPoolExecutor
 from pathlib import Path
 
-from .wine_base_operations import BaseWineOperations, OperationResult, safe_file_operation
+from .wine_base_operations import (
+    BaseWineOperations, OperationResult, safe_file_operation, build_divine_command, count_dir_files,
+    iter_files_with_ext
+)
 from .wine_environment import WineProcessMonitor
 
+# Extensions that are already compressed, so gain little from PAK compression
+COMPRESSED_FORMATS = frozenset({'.dds', '.ogg', '.wem', '.jpg', '.png'})
+
+# Text/script extensions that compress well
+TEXT_FORMATS = frozenset({'.lsx', '.lsj', '.lua', '.txt', '.xml'})
+
+# Average packed bytes per file below which each compression estimate applies, smallest first
+AVG_FILE_SIZE_COMPRESSION = (
+    (1024, 'high (likely lz4hc or zlib)'),
+    (4096, 'medium (likely lz4)'),
+    (float('inf'), 'low or none')
+)
+
+# PAK compression methods divine.exe accepts
+COMPRESSION_METHODS = {
+    'none': {'method': 'none', 'description': 'No compression (fastest)'},
+    'zlib': {'method': 'zlib', 'description': 'Standard zlib compression'},
+    'zlibfast': {'method': 'zlibfast', 'description': 'Fast zlib compression'},
+    'lz4': {'method': 'lz4', 'description': 'LZ4 compression (fast)'},
+    'lz4hc': {'method': 'lz4hc', 'description': 'LZ4 high compression (default)'}
+}
+
+# Divine.exe regex filters for extract_game_assets_by_type
+ASSET_PATTERNS = {
+    'textures': r'.*\.(dds|png|jpg|tga)$',
+    'models': r'.*\.(gr2|dae)$',
+    'audio': r'.*\.(wem|ogg|wav)$',
+    'scripts': r'.*\.(lsx|lsf|lsj|lua)$',
+    'localization': r'.*\.loca$',
+    'materials': r'.*/Materials/.*\.(lsf|lsx)$',
+    'animations': r'.*/Animations/.*\.gr2$',
+    'fx': r'.*/FX/.*\.(lsf|lsx)$'
+}
+
+# Parsed list-package results, one JSON file per (PAK path, mtime, size), pruned oldest-first past the limit
+LISTING_CACHE_DIR = Path.home() / ".cache" / "mac-pak" / "listings"
+LISTING_CACHE_MAX_BYTES = 500 * 1024 * 1024
+
+# A whole divine.exe list-package line: the path (which may contain spaces) runs up to the first
+# all-digit column, the size; header lines and lines starting with a number are skipped
+PAK_LISTING_LINE_RE = re.compile(
+    r'^[ \t]*(?!Opening|Package|Listing|\d+(?:[ \t\r]|$))(\S.*?)(?:[ \t]+(\d+)(?=[ \t\r]|$).*?)?[ \t\r]*$',
+    re.MULTILINE
+)
+
+# First token of each divine.exe list-package line, skipping its header lines
+PAK_LISTING_ENTRY_RE = re.compile(r'^[ \t]*(?!Opening|Package|Listing)(\S+)', re.MULTILINE)
+
+@functools.lru_cache(maxsize=64)
+def _build_ext_pattern(extensions):
+    """Build the Divine.exe regex matching any of the given extensions (without dots)"""
+    return r'.*\.(' + '|'.join(extensions) + r')$'
+
+# LSPK magic and version at the start of the file, then the file list offset for v15+ (BG3) packages
+PAK_HEADER_STRUCT = struct.Struct('<4sIQ')
+PAK_FILE_COUNT_STRUCT = struct.Struct('<I')
+PAK_MIN_HEADER_VERSION = 15
+
+def read_pak_file_count(pak_file):
+    """Read the file count from a PAK's LSPK header, or None if the header isn't a known layout"""
+    try:
+        with open(pak_file, 'rb') as f:
+            magic, version, file_list_offset = PAK_HEADER_STRUCT.unpack(f.read(PAK_HEADER_STRUCT.size))
+            if magic != b'LSPK' or version < PAK_MIN_HEADER_VERSION:
+                return None
+            
+            # The file list starts with its entry count
+            f.seek(file_list_offset)
+            return PAK_FILE_COUNT_STRUCT.unpack(f.read(PAK_FILE_COUNT_STRUCT.size))[0]
+    except (OSError, struct.error):
+        return None
+
+def parse_pak_listing(output):
+    """Parse divine.exe list-package output into {'name', 'size', 'type'} dicts"""
+    files = []
+    for match in PAK_LISTING_LINE_RE.finditer(output):
+        name, size = match.group(1, 2)
+        files.append({
+            'name': name,
+            'size': int(size) if size else 0,
+            'type': os.path.splitext(name)[1].lower() if '.' in name else 'folder'
+        })
+    return files
+
+def _listing_cache_path(pak_file, stat_result):
+    """Cache file for a PAK listing - any change to the PAK's mtime or size gives a new key"""
+    key = f"{os.path.abspath(pak_file)}|{stat_result.st_mtime_ns}|{stat_result.st_size}"
+    return LISTING_CACHE_DIR / f"{hashlib.sha1(key.encode('utf-8')).hexdigest()}.json"
+
+def _load_cached_listing(cache_path):
+    """Return a cached listing, or None on a miss or an unreadable entry"""
+    try:
+        with open(cache_path, 'rb') as f:
+            files = json.load(f)
+        # Mark the entry as recently used so pruning keeps it
+        os.utime(cache_path)
+        return files
+    except (OSError, ValueError):
+        return None
+
+def _write_json_atomic(cache_dir, cache_path, data):
+    """Write data as JSON to cache_path via a temp file in cache_dir, so readers never see half a file"""
+    cache_dir.mkdir(parents=True, exist_ok=True)
+    temp_fd, temp_path = tempfile.mkstemp(suffix=".tmp", dir=cache_dir)
+    try:
+        with os.fdopen(temp_fd, 'w', encoding='utf-8') as f:
+            json.dump(data, f, separators=(',', ':'))
+        os.replace(temp_path, cache_path)
+    except BaseException:
+        os.unlink(temp_path)
+        raise
+
+def _store_cached_listing(cache_path, files):
+    """Atomically write a listing to the cache, then keep the cache under its size limit"""
+    try:
+        _write_json_atomic(LISTING_CACHE_DIR, cache_path, files)
+        _prune_listing_cache()
+    except OSError:
+        # The cache is only an optimization
+        pass
+
+def _prune_listing_cache():
+    """Remove least recently used listings until the cache fits LISTING_CACHE_MAX_BYTES"""
+    entries = []
+    with os.scandir(LISTING_CACHE_DIR) as it:
+        for entry in it:
+            if entry.name.endswith('.json'):
+                stat_result = entry.stat()
+                entries.append((stat_result.st_mtime, stat_result.st_size, entry.path))
+    
+    total_size = sum(size for _, size, _ in entries)
+    for _, size, path in sorted(entries):
+        if total_size <= LISTING_CACHE_MAX_BYTES:
+            break
+        try:
+            os.unlink(path)
+        except FileNotFoundError:
+            pass
+        total_size -= size
+
+# Threads used to scan a folder's subfolders concurrently - stat and scandir release the GIL
+SCAN_WORKERS = 8
+
+# Per-directory scan results for compression recommendations, one JSON file per scanned source folder
+SCAN_CACHE_DIR = Path.home() / ".cache" / "mac-pak" / "scans"
+
+def _scan_cache_path(source_dir):
+    """Cache file holding the per-directory scan results for source_dir"""
+    return SCAN_CACHE_DIR / f"{hashlib.sha1(source_dir.encode('utf-8')).hexdigest()}.json"
+
+def _load_scan_cache(cache_path):
+    """Return {directory: [mtime_ns, size, {ext: count}, subdirs]} from a previous scan, or {}"""
+    try:
+        with open(cache_path, 'rb') as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return {}
+
+def _scan_level(path, cached_levels):
+    """Scan the files directly inside path, reusing the cached result while its mtime is unchanged
+    
+    A directory's mtime only moves when entries are added, removed or renamed, so a file
+    rewritten in place keeps its old cached size until something else changes in that folder.
+    """
+    try:
+        mtime_ns = os.stat(path).st_mtime_ns
+    except OSError:
+        return None
+    
+    level = cached_levels.get(path)
+    if level is not None and level[0] == mtime_ns:
+        return level
+    
+    total_size = 0
+    file_types = Counter()
+    subdirs = []
+    try:
+        with os.scandir(path) as entries:
+            for entry in entries:
+                if entry.is_dir(follow_symlinks=False):
+                    subdirs.append(entry.path)
+                elif entry.is_file():
+                    total_size += entry.stat().st_size
+                    file_types[os.path.splitext(entry.name)[1].lower()] += 1
+    except OSError:
+        return None
+    return [mtime_ns, total_size, dict(file_types), subdirs]
+
+def _scan_file_types(root, cached_levels):
+    """Return the total size, per-extension file counts and fresh per-directory results under root"""
+    total_size = 0
+    file_types = Counter()
+    levels = {}
+    stack = [root]
+    while stack:
+        path = stack.pop()
+        level = _scan_level(path, cached_levels)
+        if level is None:
+            continue
+        levels[path] = level
+        total_size += level[1]
+        file_types.update(level[2])
+        stack.extend(level[3])
+    return total_size, file_types, levels
+
+# Size units, one per power of 1024
+SIZE_UNITS = ('B', 'KB', 'MB', 'GB', 'TB', 'PB')
+
 def format_file_size(size_bytes):
     """Format file size in human readable format"""
-    for unit in ['B', 'KB', 'MB', 'GB', 'TB']:
-        if size_bytes < 1024.0:
-            return f"{size_bytes:.1f} {unit}"
-        size_bytes /= 1024.0
-    return f"{size_bytes:.1f} PB"
+    if size_bytes < 1024:
+        return f"{size_bytes:.1f} B"
+    # Every 10 bits is one more unit
+    unit_index = min((int(size_bytes).bit_length() - 1) // 10, len(SIZE_UNITS) - 1)
+    return f"{size_bytes / (1 << (unit_index * 10)):.1f} {SIZE_UNITS[unit_index]}"
 
 class WinePakTools(BaseWineOperations):
     """Specialized module for PAK file operations"""
     
-    def __init__(self, wine_env, lslib_path, settings_manager=None):
-        super().__init__(wine_env, lslib_path, settings_manager)
-        
-        # Initialize compression methods
-        self.compression_methods = {
-            'none': {'method': 'none', 'description': 'No compression (fastest)'},
-            'zlib': {'method': 'zlib', 'description': 'Standard zlib compression'},
-            'zlibfast': {'method': 'zlibfast', 'description': 'Fast zlib compression'},
-            'lz4': {'method': 'lz4', 'description': 'LZ4 compression (fast)'},
-            'lz4hc': {'method': 'lz4hc', 'description': 'LZ4 high compression (default)'}
-        }
+    # Shared by every instance - the table never changes
+    compression_methods = COMPRESSION_METHODS
     
     def get_supported_formats(self):
         """Get PAK operation supported formats"""
@@ -49,50 +259,6 @@ class WinePakTools(BaseWineOperations):
             'description': 'Advanced PAK operations with compression, filtering, and batch processing'
         }
     
-    def mac_to_wine_path(self, mac_path):
-        """Convert Mac path to Wine path format"""
-        abs_path = os.path.abspath(mac_path)
-        wine_path = f"Z:{abs_path.replace('/', chr(92))}"
-        return wine_path
-    
-    def run_divine_command(self, action, source=None, destination=None, progress_callback=None, **kwargs):
-        """Run Divine.exe command - returns monitor for async handling"""
-        
-        print(f"DEBUG: wine_pak_tools.run_divine_command called with action={action}")
-        
-        # Build command
-        cmd = [self.wine_env.wine_path, self.lslib_path, "--action", action, "--game", "bg3"]
-        
-        if source:
-            cmd.extend(["--source", source])
-        if destination:
-            cmd.extend(["--destination", destination])
-        
-        for key, value in kwargs.items():
-            cmd.extend([f"--{key.replace('_', '-')}", str(value)])
-        
-        # Setup environment
-        env = os.environ.copy()
-        env["WINEPREFIX"] = self.wine_env.wine_prefix
-        
-        # Create monitor
-        self.current_monitor = WineProcessMonitor()
-        
-        if progress_callback:
-            self.current_monitor.progress_updated.connect(
-                lambda p, m: progress_callback(p, m)
-            )
-        
-        # Start async
-        self.current_monitor.run_process_async(cmd, env, progress_callback)
-        
-        return self.current_monitor
-    
-    def cancel_current_operation(self):
-        """Cancel the currently running PAK operation"""
-        if self.current_monitor:
-            self.current_monitor.cancel()
-    
     def extract_pak_async(self, pak_file, dest_dir):
         """Extract PAK asynchronously - returns WineProcessMonitor immediately"""
         wine_pak_path = self.mac_to_wine_path(pak_file)
@@ -100,16 +266,11 @@ class WinePakTools(BaseWineOperations):
         
         os.makedirs(dest_dir, exist_ok=True)
         
-        cmd = [
-            self.wine_env.wine_path, self.lslib_path,
-            "--action", "extract-package",
-            "--game", "bg3",
-            "--source", wine_pak_path,
-            "--destination", wine_dest_path
-        ]
+        cmd = build_divine_command(
+            self.wine_env.wine_path, self.lslib_path, "extract-package", wine_pak_path, wine_dest_path
+        )
         
-        env = os.environ.copy()
-        env["WINEPREFIX"] = self.wine_env.wine_prefix
+        env = self.wine_env.get_process_env()
         
         # Create monitor
         self.current_monitor = WineProcessMonitor()
@@ -131,16 +292,11 @@ class WinePakTools(BaseWineOperations):
         if pak_dir:
             os.makedirs(pak_dir, exist_ok=True)
         
-        cmd = [
-            self.wine_env.wine_path, self.lslib_path,
-            "--action", "create-package",
-            "--game", "bg3",
-            "--source", wine_source_path,
-            "--destination", wine_pak_path
-        ]
+        cmd = build_divine_command(
+            self.wine_env.wine_path, self.lslib_path, "create-package", wine_source_path, wine_pak_path
+        )
         
-        env = os.environ.copy()
-        env["WINEPREFIX"] = self.wine_env.wine_prefix
+        env = self.wine_env.get_process_env()
         
         self.current_monitor = WineProcessMonitor()
         self.current_monitor.run_process_async(cmd, env)
@@ -151,29 +307,47 @@ class WinePakTools(BaseWineOperations):
         """List PAK contents asynchronously - returns WineProcessMonitor immediately"""
         wine_pak_path = self.mac_to_wine_path(pak_file)
         
-        cmd = [
-            self.wine_env.wine_path, self.lslib_path,
-            "--action", "list-package",
-            "--game", "bg3",
-            "--source", wine_pak_path
-        ]
+        cmd = build_divine_command(self.wine_env.wine_path, self.lslib_path, "list-package", wine_pak_path)
         
-        env = os.environ.copy()
-        env["WINEPREFIX"] = self.wine_env.wine_prefix
-
-        print(cmd)
-        print(self.wine_env.wine_prefix)
+        env = self.wine_env.get_process_env()
         
         self.current_monitor = WineProcessMonitor()
         self.current_monitor.run_process_async(cmd, env)
         
         return self.current_monitor
     
+    def list_pak_contents(self, pak_file, use_cache=True):
+        """List the files in a PAK - SYNCHRONOUS
+        
+        Returns dicts with name, size and type. Listings are cached on disk until the PAK changes.
+        """
+        cache_path = _listing_cache_path(pak_file, os.stat(pak_file))
+        if use_cache:
+            files = _load_cached_listing(cache_path)
+            if files is not None:
+                return files
+        
+        success, output = self.run_divine_command(
+            action="list-package",
+            source=self.mac_to_wine_path(pak_file)
+        )
+        
+        if not success:
+            raise RuntimeError(f"PAK listing failed: {output}")
+        
+        files = parse_pak_listing(output)
+        _store_cached_listing(cache_path, files)
+        return files
+    
     def get_pak_info(self, pak_file):
         """Get detailed information about a PAK file"""
         try:
             file_size = os.path.getsize(pak_file)
-            file_count = len(self.list_pak_contents(pak_file))
+            file_count = read_pak_file_count(pak_file)
+            
+            if file_count is None:
+                # Unrecognised header - fall back to the (cached) divine.exe listing
+                file_count = len(self.list_pak_contents(pak_file))
             
             return {
                 'file_path': pak_file,
@@ -298,16 +472,14 @@ class WinePakTools(BaseWineOperations):
         )
         
         if success:
-            # Count extracted files
-            extracted_files = []
-            for root, dirs, files in os.walk(output_dir):
-                extracted_files.extend(files)
+            # Count extracted files without building a list of names
+            extracted_count = count_dir_files(output_dir)
             
             return OperationResult.success_result(
-                f"Successfully extracted {len(extracted_files)} files matching '{expression}'",
+                f"Successfully extracted {extracted_count} files matching '{expression}'",
                 data={
                     "output_dir": output_dir,
-                    "extracted_count": len(extracted_files),
+                    "extracted_count": extracted_count,
                     "filter_expression": expression,
                     "filter_type": "regex" if use_regex else "glob"
                 },
@@ -336,20 +508,14 @@ class WinePakTools(BaseWineOperations):
         )
         
         if success:
-            # Parse output to extract filtered file list
-            files = []
-            lines = output.split('\n')
-            for line in lines:
-                line = line.strip()
-                if line and not line.startswith('Opening') and not line.startswith('Package') and not line.startswith('Listing'):
-                    # Parse divine.exe output
-                    parts = line.split()
-                    if parts:
-                        file_path = parts[0]
-                        files.append({
-                            'name': file_path,
-                            'type': os.path.splitext(file_path)[1].lower() if '.' in file_path else 'folder'
-                        })
+            # Parse output to extract filtered file list - one regex scan over the whole output
+            files = [
+                {
+                    'name': file_path,
+                    'type': os.path.splitext(file_path)[1].lower() if '.' in file_path else 'folder'
+                }
+                for file_path in PAK_LISTING_ENTRY_RE.findall(output)
+            ]
             
             return OperationResult.success_result(
                 f"Found {len(files)} files matching '{expression}'",
@@ -368,15 +534,12 @@ class WinePakTools(BaseWineOperations):
             )
     
     def batch_extract_paks(self, pak_directory, output_base_dir, expression="*", 
-                          use_package_name=True, progress_callback=None):
+                          use_package_name=True, progress_callback=None, max_workers=None):
         """Extract multiple PAK files in a directory"""
+        self._batch_cancelled.clear()
         
         # Find all PAK files
-        pak_files = []
-        for root, dirs, files in os.walk(pak_directory):
-            for file in files:
-                if file.lower().endswith('.pak'):
-                    pak_files.append(os.path.join(root, file))
+        pak_files = list(iter_files_with_ext(pak_directory, '.pak'))
         
         if not pak_files:
             return OperationResult.error_result(
@@ -384,31 +547,46 @@ class WinePakTools(BaseWineOperations):
                 operation_type="batch_extract_paks"
             )
         
-        kwargs = {
-            "expression": expression
-        }
-        
-        if use_package_name:
-            kwargs["use_package_name"] = True
-        
         self.ensure_directory_exists(output_base_dir)
         
         if progress_callback:
             progress_callback(10, f"Starting batch extraction of {len(pak_files)} PAK files...")
         
-        success, output = self.run_divine_command(
-            action="extract-packages",
-            source=self.mac_to_wine_path(pak_directory),
-            destination=self.mac_to_wine_path(output_base_dir),
-            progress_callback=progress_callback,
-            **kwargs
-        )
+        # Parallel runs only when each PAK gets its own folder - with a shared destination, or two
+        # PAKs with the same name in different subfolders, concurrent Divine.exe processes would
+        # write overlapping paths
+        pak_stems = [os.path.splitext(os.path.basename(pak_file))[0] for pak_file in pak_files]
+        if len(pak_files) == 1 or not use_package_name or len(set(pak_stems)) < len(pak_stems):
+            kwargs = {
+                "expression": expression
+            }
+            
+            if use_package_name:
+                kwargs["use_package_name"] = True
+            
+            success, output = self.run_divine_command(
+                action="extract-packages",
+                source=self.mac_to_wine_path(pak_directory),
+                destination=self.mac_to_wine_path(output_base_dir),
+                progress_callback=progress_callback,
+                **kwargs
+            )
+        else:
+            # One Divine.exe per PAK, several at a time, instead of one process extracting them in turn
+            extractions = [
+                (pak_file, os.path.join(output_base_dir, pak_stem))
+                for pak_file, pak_stem in zip(pak_files, pak_stems)
+            ]
+            
+            _, failures = self.convert_files_parallel(
+                extractions, "extract-package", progress_callback, max_workers,
+                progress_range=(10, 85), verify_output=False, progress_verb="Extracted", expression=expression
+            )
+            success, output = not failures, "; ".join(failures)
         
         if success:
             # Count total extracted files
-            total_extracted = 0
-            for root, dirs, files in os.walk(output_base_dir):
-                total_extracted += len(files)
+            total_extracted = count_dir_files(output_base_dir)
             
             return OperationResult.success_result(
                 f"Successfully extracted {len(pak_files)} PAK files ({total_extracted} total files)",
@@ -439,8 +617,7 @@ class WinePakTools(BaseWineOperations):
             file_extensions = [file_extensions]
         
         # Remove dots and create regex pattern
-        extensions = [ext.lstrip('.') for ext in file_extensions]
-        pattern = r'.*\.(' + '|'.join(extensions) + r')$'
+        pattern = _build_ext_pattern(tuple(sorted(ext.lstrip('.') for ext in file_extensions)))
         
         return self.extract_with_filter(
             pak_file, output_dir, 
@@ -451,28 +628,27 @@ class WinePakTools(BaseWineOperations):
     
     def extract_game_assets_by_type(self, pak_file, output_dir, asset_type, progress_callback=None):
         """Extract specific game asset types with predefined patterns"""
+        return self.extract_game_assets_by_types(pak_file, output_dir, [asset_type], progress_callback)
+    
+    def extract_game_assets_by_types(self, pak_file, output_dir, asset_types, progress_callback=None):
+        """Extract several predefined game asset types in a single Divine.exe pass"""
         
-        asset_patterns = {
-            'textures': r'.*\.(dds|png|jpg|tga)$',
-            'models': r'.*\.(gr2|dae)$',
-            'audio': r'.*\.(wem|ogg|wav)$',
-            'scripts': r'.*\.(lsx|lsf|lsj|lua)$',
-            'localization': r'.*\.loca$',
-            'materials': r'.*/Materials/.*\.(lsf|lsx)$',
-            'animations': r'.*/Animations/.*\.gr2$',
-            'fx': r'.*/FX/.*\.(lsf|lsx)$'
-        }
-        
-        if asset_type not in asset_patterns:
+        asset_types = list(asset_types)
+        unknown_types = [asset_type for asset_type in asset_types if asset_type not in ASSET_PATTERNS]
+        if unknown_types or not asset_types:
             return OperationResult.error_result(
-                f"Unknown asset type: {asset_type}. Available: {', '.join(asset_patterns.keys())}",
+                f"Unknown asset type: {', '.join(unknown_types)}. Available: {', '.join(ASSET_PATTERNS.keys())}",
                 operation_type="extract_game_assets_by_type"
             )
         
-        pattern = asset_patterns[asset_type]
+        # One alternation of all the requested patterns, so the PAK is opened and indexed once
+        if len(asset_types) == 1:
+            pattern = ASSET_PATTERNS[asset_types[0]]
+        else:
+            pattern = '|'.join(f'(?:{ASSET_PATTERNS[asset_type]})' for asset_type in asset_types)
         
         if progress_callback:
-            progress_callback(5, f"Extracting {asset_type} assets...")
+            progress_callback(5, f"Extracting {', '.join(asset_types)} assets...")
         
         return self.extract_with_filter(
             pak_file, output_dir,
@@ -484,32 +660,26 @@ class WinePakTools(BaseWineOperations):
     def analyze_pak_compression(self, pak_file):
         """Analyze PAK file compression and structure"""
         try:
-            # Get basic file info
+            # Get basic file info - includes the file count, read from the header when possible
             file_info = self.get_pak_info(pak_file)
+            if 'error' in file_info:
+                return file_info
+            
+            file_count = file_info['file_count']
             
-            # List contents to get file count
-            list_result = self.list_pak_with_filter(pak_file)
+            # Estimate compression ratio (very rough) - a very small average means high compression
+            avg_file_size = file_info['file_size'] / max(file_count, 1)
             
             analysis = {
                 'file_path': pak_file,
                 'file_size': file_info['file_size'],
                 'size_human': file_info['size_human'],
-                'estimated_compression': 'unknown'
+                'file_count': file_count,
+                'estimated_compression': next(
+                    label for threshold, label in AVG_FILE_SIZE_COMPRESSION if avg_file_size < threshold
+                )
             }
             
-            if list_result.success:
-                file_count = list_result.data['file_count']
-                analysis['file_count'] = file_count
-                
-                # Estimate compression ratio (very rough)
-                avg_file_size = file_info['file_size'] / max(file_count, 1)
-                if avg_file_size < 1024:  # Very small average = high compression
-                    analysis['estimated_compression'] = 'high (likely lz4hc or zlib)'
-                elif avg_file_size < 4096:
-                    analysis['estimated_compression'] = 'medium (likely lz4)'
-                else:
-                    analysis['estimated_compression'] = 'low or none'
-            
             return analysis
             
         except Exception as e:
@@ -518,26 +688,42 @@ class WinePakTools(BaseWineOperations):
     def get_compression_recommendations(self, source_dir):
         """Get compression method recommendations based on content"""
         try:
-            # Analyze directory contents
-            total_size = 0
-            file_count = 0
-            file_types = {}
+            # Analyze directory contents - top-level files here, each subfolder on a worker thread.
+            # Directories unchanged since the last scan reuse their cached counts.
+            source_dir = os.path.abspath(source_dir)
+            cache_path = _scan_cache_path(source_dir)
+            cached_levels = _load_scan_cache(cache_path)
+            
+            root_level = _scan_level(source_dir, cached_levels)
+            if root_level is None:
+                raise FileNotFoundError(f"Cannot read directory: {source_dir}")
+            
+            levels = {source_dir: root_level}
+            total_size = root_level[1]
+            file_types = Counter(root_level[2])
+            subdirs = root_level[3]
+            
+            if subdirs:
+                with ThreadPoolExecutor(max_workers=min(SCAN_WORKERS, len(subdirs))) as executor:
+                    scan = functools.partial(_scan_file_types, cached_levels=cached_levels)
+                    for subdir_size, subdir_types, subdir_levels in executor.map(scan, subdirs):
+                        total_size += subdir_size
+                        file_types.update(subdir_types)
+                        levels.update(subdir_levels)
+            
+            try:
+                _write_json_atomic(SCAN_CACHE_DIR, cache_path, levels)
+            except OSError:
+                # The cache is only an optimization
+                pass
             
-            for root, dirs, files in os.walk(source_dir):
-                for file in files:
-                    file_path = os.path.join(root, file)
-                    size = os.path.getsize(file_path)
-                    total_size += size
-                    file_count += 1
-                    
-                    ext = os.path.splitext(file)[1].lower()
-                    file_types[ext] = file_types.get(ext, 0) + 1
+            file_count = sum(file_types.values())
             
             recommendations = {
                 'total_size': total_size,
                 'total_size_human': format_file_size(total_size),
                 'file_count': file_count,
-                'file_types': file_types,
+                'file_types': dict(file_types),
                 'recommended_compression': 'lz4hc',  # Default
                 'reasoning': []
             }
@@ -551,16 +737,14 @@ class WinePakTools(BaseWineOperations):
                 recommendations['reasoning'].append("Small archive - prioritize speed")
             
             # Check for already compressed content
-            compressed_formats = ['.dds', '.ogg', '.wem', '.jpg', '.png']
-            compressed_files = sum(count for ext, count in file_types.items() if ext in compressed_formats)
+            compressed_files = sum(file_types[ext] for ext in COMPRESSED_FORMATS & file_types.keys())
             
             if compressed_files > file_count * 0.7:  # >70% already compressed
                 recommendations['recommended_compression'] = 'lz4'
                 recommendations['reasoning'].append("Mostly pre-compressed files - light compression")
             
             # Check for text/script heavy content
-            text_formats = ['.lsx', '.lsj', '.lua', '.txt', '.xml']
-            text_files = sum(count for ext, count in file_types.items() if ext in text_formats)
+            text_files = sum(file_types[ext] for ext in TEXT_FORMATS & file_types.keys())
             
             if text_files > file_count * 0.5:  # >50% text files
                 recommendations['recommended_compression'] = 'lz4hc'
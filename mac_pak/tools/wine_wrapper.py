@@ -9,6 +9,7 @@ import sys
 from pathlib import Path
 
 from .wine_environment import WineEnvironmentManager, WineProcessMonitor
+from .wine_base_operations import build_divine_command, to_wine_path
 from .wine_pak_tools import WinePakTools
 from .wine_ls_tools import WineLSTools
 from .wine_loca_processor import WineLocaProcessor
@@ -73,7 +74,7 @@ class WineWrapper:
             self.wine_env.initialize_wine_prefix()
         
         # Validate lslib path
-        if self.lslib_path and not os.path.exists(self.lslib_path.replace("Z:", "")):
+        if self.lslib_path and not os.path.exists(self.wine_to_mac_path(self.lslib_path)):
             print(f"Warning: Divine.exe not found: {self.lslib_path}")
         
         print(f"Setup validation successful")
@@ -87,30 +88,17 @@ class WineWrapper:
         print(f"DEBUG: wine_wrapper.run_divine_command called with action={action}")
         
         # Build command
-        cmd = [self.wine_env.wine_path, self.lslib_path, "--action", action, "--game", "bg3"]
-        
-        if source:
-            cmd.extend(["--source", source])
-        if destination:
-            cmd.extend(["--destination", destination])
-        
-        # Add additional arguments
-        for key, value in kwargs.items():
-            cmd.extend([f"--{key.replace('_', '-')}", str(value)])
+        cmd = build_divine_command(
+            self.wine_env.wine_path, self.lslib_path, action, source, destination, **kwargs
+        )
         
         # Setup environment
-        env = os.environ.copy()
-        env["WINEPREFIX"] = self.wine_env.wine_prefix
+        env = self.wine_env.get_process_env()
         
         # Create a new monitor for this operation
         self.current_monitor = WineProcessMonitor()
         
-        if progress_callback:
-            self.current_monitor.progress_updated.connect(
-                lambda p, m: progress_callback(p, m)
-            )
-        
-        # Start async process - returns immediately
+        # The monitor calls progress_callback itself, so it isn't also connected to progress_updated
         self.current_monitor.run_process_async(cmd, env, progress_callback)
         
         # Return the monitor so caller can connect to its signals
@@ -127,9 +115,11 @@ class WineWrapper:
     
     def mac_to_wine_path(self, mac_path):
         """Convert Mac path to Wine path format - shared utility"""
-        abs_path = os.path.abspath(mac_path)
-        wine_path = f"Z:{abs_path.replace('/', chr(92))}"  # Use chr(92) for backslash
-        return wine_path
+        return to_wine_path(mac_path)
+    
+    def wine_to_mac_path(self, wine_path):
+        """Convert Wine path back to Mac path format - shared utility"""
+        return self.pak_ops.wine_to_mac_path(wine_path)
     
     def get_system_info(self):
         """Get comprehensive system information for debugging"""
@@ -183,6 +173,10 @@ class WineWrapper:
         """Convert LSF file or content to LSX format"""
         return self.binary_converter.convert_lsf_to_lsx(source, lsx_file, is_content)
     
+    def convert_many(self, pairs, input_format="lsx", output_format="lsf", progress_callback=None):
+        """Convert (source, destination) file pairs with one Divine.exe run - failures are keyed by source"""
+        return self.binary_converter.convert_many(pairs, input_format, output_format, progress_callback)
+    
     # Delegate loca operations to specialized module
     def analyze_loca_file_binary(self, loca_path):
         """Analyze .loca file structure without conversion"""
@@ -224,9 +218,9 @@ def run_wine_command(command, timeout=None, settings_manager=None, **kwargs):
     
     # Use the wine_env directly for simple commands
     wine_cmd = [wrapper.wine_env.wine_path] + command
-    env = os.environ.copy()
-    env["WINEPREFIX"] = wrapper.wine_env.wine_prefix
+    env = wrapper.wine_env.get_process_env()
     
+    kwargs.setdefault("close_fds", False)
     return subprocess.run(wine_cmd, env=env, timeout=timeout, **kwargs)
 
 def run_lslib_command(lslib_path, args, timeout=300, settings_manager=None):
@@ -237,7 +231,6 @@ def run_lslib_command(lslib_path, args, timeout=300, settings_manager=None):
     
     # Simple wrapper for backward compatibility
     wine_cmd = [wrapper.wine_env.wine_path, lslib_path] + args
-    env = os.environ.copy()
-    env["WINEPREFIX"] = wrapper.wine_env.wine_prefix
+    env = wrapper.wine_env.get_process_env()
     
-    return subprocess.run(wine_cmd, env=env, timeout=timeout, capture_output=True, text=True)
\ No newline at end of file
+    return subprocess.run(wine_cmd, env=env, timeout=timeout, capture_output=True, text=True, close_fds=False)
\ No newline at end of file
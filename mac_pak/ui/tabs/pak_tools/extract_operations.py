@@ -8,6 +8,7 @@ import os
 from PyQt6.QtWidgets import QFileDialog, QMessageBox
 from PyQt6.QtCore import pyqtSignal, QObject
 
+from ....tools.wine_base_operations import count_dir_files
 from ...threads.pak_operations_thread import IndividualExtractionThread
 from ...dialogs.file_selection_dialog import FileSelectionDialog
 from ...dialogs.progress_dialog import ProgressDialog
@@ -90,7 +91,7 @@ class ExtractOperations(QObject):
         self.tab.set_pak_buttons_enabled(True)
         
         if success:
-            file_count = len([f for root, dirs, files in os.walk(dest_dir) for f in files])
+            file_count = count_dir_files(dest_dir)
             self.tab.add_result_text(f"✅ Successfully extracted {file_count} files to {dest_dir}")
             self.tab.add_result_text("-" * 60)
         else:
@@ -9,6 +9,7 @@ from PyQt6.QtWidgets import QFileDialog, QMessageBox
 from PyQt6.QtCore import QObject
 
 from ...dialogs.progress_dialog import ProgressDialog
+from ....tools.wine_pak_tools import PAK_LISTING_LINE_RE
 
 
 class ListOperations(QObject):
@@ -20,6 +21,7 @@ class ListOperations(QObject):
         self.wine_wrapper = wine_wrapper
         self.settings_manager = settings_manager
         self.current_monitor = None
+        self._listed_files = []
     
     def list_pak_contents(self):
         """List PAK file contents - async"""
@@ -52,16 +54,26 @@ class ListOperations(QObject):
         self.tab.progress_dialog.canceled.connect(self.cancel_current_operation)
         self.tab.progress_dialog.show()
         
+        # Parse entries as divine.exe prints them instead of re-splitting the whole listing at the end
+        self._listed_files = []
         self.current_monitor = self.wine_wrapper.pak_ops.list_pak_contents_async(pak_file)
+        self.current_monitor.line_received.connect(self._on_list_line)
         self.current_monitor.progress_updated.connect(self.on_operation_progress)
         self.current_monitor.process_finished.connect(
             lambda success, output: self._on_list_finished(success, output, pak_file)
         )
     
+    def _on_list_line(self, line):
+        """Collect one listed file as soon as its line arrives"""
+        file_path = self._parse_listing_line(line)
+        if file_path:
+            self._listed_files.append(file_path)
+    
     def _on_list_finished(self, success, output, pak_file):
         """Handle listing completion"""
         try:
             self.current_monitor.progress_updated.disconnect(self.on_operation_progress)
+            self.current_monitor.line_received.disconnect(self._on_list_line)
         except TypeError:
             pass
         
@@ -82,7 +94,7 @@ class ListOperations(QObject):
         self.tab.set_pak_buttons_enabled(True)
         
         if success:
-            files = self._parse_pak_listing(output)
+            files = self._listed_files
             self.tab.add_result_text(f"✅ Found {len(files)} files in {os.path.basename(pak_file)}")
             self.tab.add_result_text("-" * 60)
             
@@ -103,28 +115,11 @@ class ListOperations(QObject):
             self.current_monitor.deleteLater()
             self.current_monitor = None
     
-    def _parse_pak_listing(self, output):
-        """Parse divine.exe list output into file paths"""
-        files = []
-        lines = output.split('\n')
-        
-        for line in lines:
-            line = line.strip()
-            if line and not line.startswith('Opening') and not line.startswith('Package') and not line.startswith('Listing'):
-                # Extract file path from divine.exe output
-                parts = line.split()
-                if parts:
-                    path_parts = []
-                    for part in parts:
-                        if part.isdigit():
-                            break
-                        path_parts.append(part)
-                    
-                    if path_parts:
-                        file_path = ' '.join(path_parts)
-                        files.append(file_path)
-        
-        return files
+    def _parse_listing_line(self, line):
+        """Extract the file path from one line of divine.exe list output, or None"""
+        # Same pattern parse_pak_listing uses, so streamed and cached listings agree
+        match = PAK_LISTING_LINE_RE.match(line)
+        return match.group(1) if match else None
     
     def on_operation_progress(self, percentage, message):
         """Handle progress updates"""
@@ -263,6 +263,7 @@ class BatchConversionThread(QThread):
         self.output_dir = output_dir
         self.converter = converter
         self._cancelled = False
+        self._running_wine_batch = False
         self.setTerminationEnabled(True)
     
     def run(self):
@@ -270,6 +271,14 @@ class BatchConversionThread(QThread):
         total = len(self.file_list)
         
         try:
+            # LSF conversions go through Wine - start it once for the whole batch
+            if total > 1 and 'lsf' in (self.source_format, self.target_format):
+                if not self._cancelled:
+                    successful = self._convert_with_single_divine_run()
+                if not self._cancelled:
+                    self.batch_complete.emit(successful, total)
+                return
+            
             for i, file_path in enumerate(self.file_list):
                 if self._cancelled:
                     break
@@ -280,11 +289,7 @@ class BatchConversionThread(QThread):
                 if self._cancelled:
                     break
                 
-                if self.output_dir:
-                    base_name = os.path.splitext(filename)[0]
-                    output_path = os.path.join(self.output_dir, f"{base_name}.{self.target_format}")
-                else:
-                    output_path = os.path.splitext(file_path)[0] + f".{self.target_format}"
+                output_path = self._output_path(file_path)
                 
                 try:
                     success = self._convert_single_file(file_path, output_path)
@@ -306,6 +311,37 @@ class BatchConversionThread(QThread):
         finally:
             self.finished.emit()
     
+    def _output_path(self, file_path):
+        """Where the converted copy of file_path is written"""
+        if self.output_dir:
+            base_name = os.path.splitext(os.path.basename(file_path))[0]
+            return os.path.join(self.output_dir, f"{base_name}.{self.target_format}")
+        return os.path.splitext(file_path)[0] + f".{self.target_format}"
+    
+    def _convert_with_single_divine_run(self):
+        """Convert every file with one Divine.exe run, then report each file's result"""
+        pairs = [(file_path, self._output_path(file_path)) for file_path in self.file_list]
+        total = len(pairs)
+        
+        def report_progress(percent, message):
+            # Map Divine's percentage onto the batch's file count
+            self.batch_progress.emit(min(total, max(1, percent * total // 100)), total, message)
+        
+        self._running_wine_batch = True
+        try:
+            successful, failures = self.wine_wrapper.convert_many(
+                pairs, self.source_format, self.target_format, report_progress
+            )
+        finally:
+            self._running_wine_batch = False
+        
+        # convert_many maps each source it didn't convert to the error
+        for file_path, _ in pairs:
+            error = failures.get(file_path)
+            self.file_converted.emit(file_path, error is None, error or "")
+        
+        return successful
+    
     def _convert_single_file(self, source_path, dest_path):
         needs_wine = (self.source_format == 'lsf' or self.target_format == 'lsf')
         
@@ -329,6 +365,9 @@ class BatchConversionThread(QThread):
     def cancel(self):
         self._cancelled = True
         self.requestInterruption()
+        # Stop this thread's Divine.exe batch too - it doesn't poll _cancelled
+        if self._running_wine_batch:
+            self.wine_wrapper.binary_converter.cancel_current_operation()
     
     def is_cancelled(self):
         return self._cancelled or self.isInterruptionRequested()